@@ -4,9 +4,13 @@
 # date: 2023/9/6
 
 from dupfilter.filters.file import FileFilter
+from dupfilter.filters.file import FileBloomFilter
 from dupfilter.filters.memory import MemoryFilter
+from dupfilter.filters.memory import MemoryBloomFilter
 from dupfilter.filters.redis.bloomfilter import RedisBloomFilter
 from dupfilter.filters.redis.bloomfilter import AsyncRedisBloomFilter
+from dupfilter.filters.redis.bloomfilter import RedisScalableBloomFilter
+from dupfilter.filters.redis.bloomfilter import AsyncRedisScalableBloomFilter
 from dupfilter.filters.redis.stringfilter import RedisStringFilter
 from dupfilter.filters.redis.stringfilter import AsyncRedisStringFilter
 from dupfilter.filters.redis.setfilter import RedisSetFilter
@@ -14,12 +18,21 @@ from dupfilter.filters.redis.setfilter import AsyncRedisSetFilter
 from dupfilter.filters.redis.sortedsetfilter import RedisSortedSetFilter
 from dupfilter.filters.redis.sortedsetfilter import AsyncRedisSortedSetFilter
 from dupfilter.filters.sql import SQLFilter
+from dupfilter.filters.sql import PooledSQLFilter
 from dupfilter.filters.sql.mysql import MySQLFilter
+from dupfilter.filters.sql.mysql import PooledMySQLFilter
 from dupfilter.filters.sql.mysql import AsyncMySQLFilter
+from dupfilter.filters.sql.mysql import MariaDBFilter
+from dupfilter.filters.sql.mysql import AsyncMariaDBFilter
 from dupfilter.filters.sql.oracle import OracleSQLFilter
 from dupfilter.filters.sql.oracle import AsyncOracleSQLFilter
 from dupfilter.filters.sql.sqlite import SQLiteFilter
+from dupfilter.filters.sql.sqlite import PooledSQLiteFilter
+from dupfilter.filters.sql.sqlite import TunedSQLiteFilter
 from dupfilter.filters import DefaultFilter
+from dupfilter.filters.cache import CacheFilter
+from dupfilter.filters.cache import AsyncCacheFilter
+from dupfilter.filters.batch import AsyncBatchFilter
 from dupfilter.filters import AsyncDefaultFilter
 from dupfilter.filters import FilterCounter
 from dupfilter.filters import PageFilterCounter
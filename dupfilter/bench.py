@@ -0,0 +1,311 @@
+# -*- coding:utf-8 -*-
+# author: kusen
+# email: 1194542196@qq.com
+# date: 2024/3/20
+
+"""
+去重方案基准测试，统计各方案吞吐量(ops/s)、单次调用p50/p99延迟及单个去重值内存占用，
+SQLite方案统计单个去重值占用的数据库文件大小
+
+python -m dupfilter.bench
+python -m dupfilter.bench --backends memory,sqlite --batch-sizes 1,100,10000
+python -m dupfilter.bench --redis-url redis://127.0.0.1:6379/15
+
+未指定--redis-url时尝试使用fakeredis，均不可用则跳过Redis方案
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import math
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from dupfilter.filters.file import FileFilter
+from dupfilter.filters.memory import MemoryFilter, MemoryBloomFilter
+from dupfilter.filters.redis.bloomfilter import RedisBloomFilter
+from dupfilter.filters.redis.bloomfilter import AsyncRedisBloomFilter
+from dupfilter.filters.redis.setfilter import RedisSetFilter
+from dupfilter.filters.redis.setfilter import AsyncRedisSetFilter
+from dupfilter.filters.redis.sortedsetfilter import RedisSortedSetFilter
+from dupfilter.filters.redis.sortedsetfilter import AsyncRedisSortedSetFilter
+from dupfilter.filters.sql.sqlite import SQLiteFilter
+
+BACKENDS = ['memory', 'memory_digest', 'memory_bloom', 'file', 'sqlite',
+            'redis_bloom', 'redis_set', 'redis_sorted_set']
+METHODS = ['insert_many', 'exists_many', 'exists_and_insert_many']
+KWARGS = {'logger_level': logging.WARNING}
+
+
+def percentile(values, rate):
+    if not values:
+        return 0
+    values = sorted(values)
+    index = min(int(len(values) * rate), len(values) - 1)
+    return values[index]
+
+
+def make_values(total, prefix='https://www.example.com/item/'):
+    return ['%s%s' % (prefix, i) for i in range(total)]
+
+
+def batches(values, batch_size):
+    for start in range(0, len(values), batch_size):
+        yield values[start:start + batch_size]
+
+
+def summarize(backend, method, batch_size, total, costs, memory=None):
+    elapsed = sum(costs)
+    return {
+        'backend': backend,
+        'method': method,
+        'batch_size': batch_size,
+        'ops': total / elapsed if elapsed else 0,
+        'p50': percentile(costs, 0.5) * 1000,
+        'p99': percentile(costs, 0.99) * 1000,
+        'memory': memory,
+    }
+
+
+def run(flt, method, values, batch_size):
+    func = getattr(flt, method)
+    costs = []
+    for batch in batches(values, batch_size):
+        t = time.perf_counter()
+        func(batch)
+        costs.append(time.perf_counter() - t)
+    return costs
+
+
+async def async_run(flt, method, values, batch_size):
+    func = getattr(flt, method)
+    costs = []
+    for batch in batches(values, batch_size):
+        t = time.perf_counter()
+        await func(batch)
+        costs.append(time.perf_counter() - t)
+    return costs
+
+
+def check(flt):
+    """
+    去重操作失败时会返回默认值而不抛出异常，先确认方案可用
+    """
+    value = 'dupfilter-bench-check-%s' % time.time()
+    flt.insert_many([value])
+    return flt.exists_many([value]) == [True]
+
+
+async def async_check(flt):
+    value = 'dupfilter-bench-check-%s' % time.time()
+    await flt.insert_many([value])
+    stats = await flt.exists_many([value])
+    return stats == [True]
+
+
+class Bench(object):
+    def __init__(self, total=100000, batch_sizes=(1, 100, 10000),
+                 redis_url=None, run_async=True):
+        self.total = total
+        self.batch_sizes = batch_sizes
+        self.redis_url = redis_url
+        self.run_async = run_async
+        self.tmp = tempfile.mkdtemp(prefix='dupfilter-bench-')
+        self.server, self.async_server = self._create_redis_servers()
+
+    def _create_redis_servers(self):
+        try:
+            if self.redis_url:
+                import redis
+                import redis.asyncio
+                return (redis.Redis.from_url(self.redis_url),
+                        redis.asyncio.Redis.from_url(self.redis_url))
+            import fakeredis
+            import fakeredis.aioredis
+            server = fakeredis.FakeServer()
+            return (fakeredis.FakeRedis(server=server),
+                    fakeredis.aioredis.FakeRedis(server=server))
+        except ImportError:
+            return None, None
+
+    def _redis_memory(self):
+        try:
+            return self.server.info('memory')['used_memory']
+        except Exception:
+            return None
+
+    def create(self, backend, key):
+        if backend == 'memory':
+            return MemoryFilter(**KWARGS)
+        if backend == 'memory_digest':
+            return MemoryFilter(digest_size=8, **KWARGS)
+        if backend == 'memory_bloom':
+            return MemoryBloomFilter(capacity=self.total * 2, **KWARGS)
+        if backend == 'file':
+            path = os.path.join(self.tmp, key)
+            os.makedirs(path)
+            return FileFilter(path, **KWARGS)
+        if backend == 'sqlite':
+            connection = sqlite3.connect(os.path.join(self.tmp, key + '.db'))
+            return SQLiteFilter(connection, 'dup', **KWARGS)
+        if not self.server:
+            return None
+        cls = {
+            'redis_bloom': RedisBloomFilter,
+            'redis_set': RedisSetFilter,
+            'redis_sorted_set': RedisSortedSetFilter,
+        }[backend]
+        return cls(self.server, key='dupfilter-bench-' + key,
+                   **self._redis_kwargs(backend))
+
+    def _redis_kwargs(self, backend):
+        kwargs = dict(KWARGS)
+        if backend == 'redis_bloom':
+            # 位图按测试数量设置大小，默认bit=32时每个键为512M位图
+            kwargs['bit'] = self.bloom_bit
+        return kwargs
+
+    @property
+    def bloom_bit(self):
+        return min(max(int(math.ceil(math.log2(self.total * 20))), 10), 32)
+
+    def create_async(self, backend, key):
+        if not self.async_server:
+            return None
+        cls = {
+            'redis_bloom': AsyncRedisBloomFilter,
+            'redis_set': AsyncRedisSetFilter,
+            'redis_sorted_set': AsyncRedisSortedSetFilter,
+        }.get(backend)
+        if not cls:
+            return None
+        return cls(self.async_server, key='dupfilter-bench-async-' + key,
+                   **self._redis_kwargs(backend))
+
+    def _cleanup(self, key):
+        if self.server:
+            keys = self.server.keys('dupfilter-bench-*%s*' % key)
+            if keys:
+                self.server.delete(*keys)
+
+    def measure_memory(self, backend):
+        """
+        单独插入一遍统计内存，避免tracemalloc影响耗时统计；
+        tracemalloc只统计Python分配的内存，SQLite方案改为统计数据库文件大小
+        """
+        key = '%s-memory-%s' % (backend, int(time.time() * 1000))
+        values = make_values(self.total, key)
+        in_process = backend != 'sqlite' and not backend.startswith('redis')
+        gc.collect()
+        if in_process:
+            tracemalloc.start()
+        redis_memory = self._redis_memory()
+        flt = None
+        try:
+            flt = self.create(backend, key)
+            for batch in batches(values, 10000):
+                flt.insert_many(batch)
+            if in_process:
+                return tracemalloc.get_traced_memory()[0] / self.total
+            if backend.startswith('redis') and redis_memory is not None:
+                return (self._redis_memory() - redis_memory) / self.total
+        finally:
+            if in_process:
+                tracemalloc.stop()
+            if flt is not None:
+                flt.close()
+            self._cleanup(key)
+        if backend == 'sqlite':
+            path = os.path.join(self.tmp, key + '.db')
+            return os.path.getsize(path) / self.total
+
+    def bench_backend(self, backend):
+        results = []
+        key = '%s-check-%s' % (backend, int(time.time() * 1000))
+        flt = self.create(backend, key)
+        if flt is None:
+            print('%s: 跳过，未安装redis/fakeredis' % backend)
+            return results
+        try:
+            available = check(flt)
+        finally:
+            flt.close()
+            self._cleanup(key)
+        if not available:
+            print('%s: 跳过，去重操作失败' % backend)
+            return results
+        memory = self.measure_memory(backend)
+        for batch_size in self.batch_sizes:
+            key = '%s-%s-%s' % (backend, batch_size, int(time.time() * 1000))
+            values = make_values(self.total, key)
+            flt = self.create(backend, key)
+            for method in METHODS:
+                costs = run(flt, method, values, batch_size)
+                results.append(summarize(
+                    backend, method, batch_size, len(values), costs,
+                    memory if method == 'insert_many' else None))
+            flt.close()
+            if self.run_async:
+                results.extend(asyncio.run(
+                    self.async_bench_backend(backend, key, values, batch_size)))
+            self._cleanup(key)
+        return results
+
+    async def async_bench_backend(self, backend, key, values, batch_size):
+        results = []
+        flt = self.create_async(backend, key)
+        if flt is None or not await async_check(flt):
+            return results
+        for method in METHODS:
+            costs = await async_run(flt, method, values, batch_size)
+            results.append(summarize('async_' + backend, method, batch_size,
+                                     len(values), costs))
+        return results
+
+    def run(self, backends=None):
+        results = []
+        try:
+            for backend in backends or BACKENDS:
+                results.extend(self.bench_backend(backend))
+        finally:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+        return results
+
+
+def report(results):
+    header = '%-22s %-24s %8s %12s %10s %10s %10s' % (
+        'backend', 'method', 'batch', 'ops/s', 'p50(ms)', 'p99(ms)',
+        'B/key')
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        memory = result['memory']
+        print('%-22s %-24s %8d %12.0f %10.3f %10.3f %10s' % (
+            result['backend'], result['method'], result['batch_size'],
+            result['ops'], result['p50'], result['p99'],
+            '-' if memory is None else '%.1f' % memory))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='dupfilter benchmark')
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--total', type=int, default=100000)
+    parser.add_argument('--batch-sizes', default='1,100,10000')
+    parser.add_argument('--redis-url', default=None)
+    parser.add_argument('--no-async', action='store_true')
+    args = parser.parse_args(argv)
+    bench = Bench(
+        total=args.total,
+        batch_sizes=[int(size) for size in args.batch_sizes.split(',')],
+        redis_url=args.redis_url,
+        run_async=not args.no_async)
+    report(bench.run(args.backends.split(',')))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,12 +6,17 @@
 
 import asyncio
 import functools
+import itertools
 import logging
+import random
+import time
 
 from cachetools import TTLCache
 
 from dupfilter import utils
 
+LOG_MODES = ('detail', 'sample', 'summary')
+
 
 def decorate_warning(func):
     @functools.wraps(func)
@@ -19,6 +24,7 @@ def decorate_warning(func):
         try:
             result = func(flt, value_or_values, *args, **kwargs)
         except Exception as e:
+            flt.error_count += 1
             if isinstance(value_or_values, list):
                 result = [flt.default_stat for _ in value_or_values]
             else:
@@ -32,6 +38,7 @@ def decorate_warning(func):
         try:
             result = await func(flt, value_or_values, *args, **kwargs)
         except Exception as e:
+            flt.error_count += 1
             if isinstance(value_or_values, list):
                 result = [flt.default_stat for _ in value_or_values]
             else:
@@ -46,6 +53,66 @@ def decorate_warning(func):
         return wrapper
 
 
+def decorate_chunk(func):
+    """
+    按flt.chunk_size拆分批量操作，分批执行后按顺序合并结果，
+    单批失败时只有该批返回默认值
+    """
+
+    @functools.wraps(func)
+    def wrapper(flt, values, *args, **kwargs):
+        size = flt.chunk_size
+        if not size or len(values) <= size:
+            return func(flt, values, *args, **kwargs)
+        result = []
+        for start in range(0, len(values), size):
+            result.extend(func(flt, values[start:start + size],
+                               *args, **kwargs))
+        return result
+
+    @functools.wraps(func)
+    async def async_wrapper(flt, values, *args, **kwargs):
+        size = flt.chunk_size
+        if not size or len(values) <= size:
+            return await func(flt, values, *args, **kwargs)
+        result = []
+        for start in range(0, len(values), size):
+            result.extend(await func(flt, values[start:start + size],
+                                     *args, **kwargs))
+        return result
+
+    if asyncio.iscoroutinefunction(func):
+        return async_wrapper
+    else:
+        return wrapper
+
+
+def iter_load_values(source):
+    """
+    逐个读取导入值，source为文件路径、文本文件对象（每行一个值，忽略空行）或可迭代对象
+    """
+    if isinstance(source, str):
+        with open(source, encoding='utf-8') as file:
+            yield from iter_load_values(file)
+        return
+    if hasattr(source, 'read'):
+        for line in source:
+            line = line.rstrip('\r\n')
+            if line:
+                yield line
+        return
+    yield from source
+
+
+def iter_load_batches(source, batch_size):
+    values = iter_load_values(source)
+    while True:
+        batch = list(itertools.islice(values, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
 class Reset(object):
     def __init__(self, max_count, max_rate=0.8,
                  reset_to_rate=0.5, reset_type=None,
@@ -95,6 +162,53 @@ class Reset(object):
         raise NotImplemented
 
 
+class AsyncReset(Reset):
+    """
+    异步重置，current_count返回协程，reset为协程函数；
+    同一时间只有一个重置在执行（resetting标记在首次await前设置，并由asyncio.Lock串行化），
+    background=True时重置作为后台任务执行，不阻塞触发重置的协程
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.background = kwargs.pop('background', True)
+        self._lock = None
+        self._task = None
+        super(AsyncReset, self).__init__(*args, **kwargs)
+
+    async def _used_rate(self):
+        return await self.current_count / self.max_count
+
+    async def _reset(self):
+        if self.resetting:
+            return
+        if self.get_timer():
+            return
+        self.resetting = True
+        if self.background:
+            self._task = asyncio.ensure_future(self._run())
+        else:
+            await self._run()
+
+    async def _run(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        try:
+            async with self._lock:
+                if await self._used_rate() < self.max_rate:
+                    return
+                await self.reset()
+                self.set_timer()
+        except Exception as e:
+            if not self.background:
+                raise
+            self.flt.logger.warning("重置操作失败：%s" % str(e))
+        finally:
+            self.resetting = False
+
+    async def reset(self):
+        raise NotImplemented
+
+
 def decorate_reset(func):
     @functools.wraps(func)
     def wrapper(flt, *args, **kwargs):
@@ -125,6 +239,8 @@ def decorate_reset(func):
 
 
 class Filter(object):
+    default_chunk_size = None
+
     def __init__(
             self,
             value_hash_func=utils.md5,
@@ -132,11 +248,35 @@ class Filter(object):
             default_stat=False,
             logger=None,
             logger_level=logging.DEBUG,
-            reset=None
+            reset=None,
+            log_mode='detail',
+            log_sample_rate=0.01,
+            chunk_size=None
     ):
+        """
+
+        :param value_hash_func:
+        :param value_compress_func:
+        :param default_stat:
+        :param logger:
+        :param logger_level:
+        :param reset:
+        :param log_mode: 去重结果日志方式，detail逐个记录，sample按log_sample_rate
+        抽样记录，summary每批次记录一条汇总
+        :param log_sample_rate:
+        :param chunk_size: 批量操作每批最大数量，None时使用default_chunk_size，0不拆分
+        """
+        if log_mode not in LOG_MODES:
+            raise ValueError('The log_mode must be one of %s!' % str(LOG_MODES))
+        self.log_mode = log_mode
+        self.log_sample_rate = log_sample_rate
+        self.chunk_size = self.default_chunk_size if (
+                chunk_size is None) else chunk_size
         self.value_hash_func = value_hash_func or (lambda value: value)
         self.value_compress_func = value_compress_func or (lambda value: value)
         self.default_stat = bool(default_stat)
+        # 操作失败（返回默认值）的次数
+        self.error_count = 0
         if not logger:
             self.logger = logging.getLogger('dupfilter')
             self.logger.setLevel(logger_level)
@@ -156,9 +296,19 @@ class Filter(object):
         self.reset = reset
 
     def _log_exists(self, initial_values, handle_values, stats):
+        # 每批次只判断一次日志级别，未启用时不做任何格式化
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        if self.log_mode == 'summary':
+            count = sum(1 for stat in stats if stat)
+            self.logger.info('去重结果：共%s个，重复%s个，不重复%s个',
+                             len(stats), count, len(stats) - count)
+            return
         for mixed in zip(stats, handle_values, initial_values):
-            self.logger.info('去重结果：%s，去重值：%s，原始值：%s' % (
-                mixed[0], mixed[1], mixed[2]))
+            if self.log_mode == 'sample' and (
+                    random.random() >= self.log_sample_rate):
+                continue
+            self.logger.info('去重结果：%s，去重值：%s，原始值：%s', *mixed)
 
     def exists(self, value):
         raise NotImplemented
@@ -178,6 +328,56 @@ class Filter(object):
     def exists_and_insert_many(self, values):
         pass
 
+    def load(self, source, batch_size=100000, progress=None):
+        """
+        批量导入已有去重值（预热），流式读取，每批导入后报告进度，
+        不记录去重日志也不触发重置；异步方案返回协程
+        :param source: 文件路径、文本文件对象（每行一个值）或可迭代对象
+        :param batch_size: 每批数量
+        :param progress: 进度回调progress(已导入数量)，None时以INFO日志输出
+        :return: 导入数量
+        """
+        if asyncio.iscoroutinefunction(self.insert_many):
+            return self._async_load(source, batch_size, progress)
+        count, start = 0, time.time()
+        for batch in iter_load_batches(source, batch_size):
+            self._load_many(batch)
+            count += len(batch)
+            self._load_progress(progress, count, start)
+        self._load_done()
+        return count
+
+    async def _async_load(self, source, batch_size, progress):
+        count, start = 0, time.time()
+        for batch in iter_load_batches(source, batch_size):
+            result = self._load_many(batch)
+            if asyncio.iscoroutine(result):
+                await result
+            count += len(batch)
+            self._load_progress(progress, count, start)
+        result = self._load_done()
+        if asyncio.iscoroutine(result):
+            await result
+        return count
+
+    def _load_progress(self, progress, count, start):
+        if progress is not None:
+            progress(count)
+        else:
+            self.logger.info('已导入%s个，耗时%.1f秒', count, time.time() - start)
+
+    def _load_many(self, values):
+        """
+        导入一批值，默认调用insert_many，各方案可改为更快的批量写入方式，异步方案可返回协程
+        """
+        return self.insert_many(values)
+
+    def _load_done(self):
+        """
+        全部导入后调用，异步方案可返回协程
+        """
+        pass
+
     def _value_hash(self, value):
         return self.value_hash_func(value)
 
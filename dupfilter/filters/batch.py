@@ -0,0 +1,102 @@
+# -*- coding:utf-8 -*-
+# author: kusen
+# email: 1194542196@qq.com
+# date: 2024/3/20
+
+
+import asyncio
+
+
+class AsyncBatchFilter(object):
+    def __init__(self, flt, max_size=1000, max_delay=0.005):
+        """
+        异步合并批量，包装任意异步去重方案（AsyncRedis*Filter、AsyncMySQLFilter等），
+        将并发的单个exists/insert/exists_and_insert调用在max_delay秒内或累计max_size个后
+        合并为一次*_many调用，再将结果分发给各个等待的协程；
+        不同方法分别合并，同一个值的并发exists与insert之间不保证先后顺序
+        :param flt: 异步去重方案
+        :param max_size: 单批最大数量
+        :param max_delay: 最大等待时间（秒）
+        """
+        self.flt = flt
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.batch_count = 0
+        self.value_count = 0
+        self._batches = {}
+        self._timers = {}
+        self._tasks = set()
+
+    def __getattr__(self, name):
+        return getattr(self.flt, name)
+
+    async def exists(self, value):
+        return await self._submit('exists_many', value)
+
+    async def insert(self, value):
+        return await self._submit('insert_many', value)
+
+    async def exists_and_insert(self, value):
+        return await self._submit('exists_and_insert_many', value)
+
+    async def exists_many(self, values):
+        return await self.flt.exists_many(values)
+
+    async def insert_many(self, values):
+        return await self.flt.insert_many(values)
+
+    async def exists_and_insert_many(self, values):
+        return await self.flt.exists_and_insert_many(values)
+
+    async def _submit(self, method, value):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._batches.setdefault(method, [])
+        batch.append((value, future))
+        if len(batch) >= self.max_size:
+            self._flush(method)
+        elif len(batch) == 1:
+            self._timers[method] = loop.call_later(
+                self.max_delay, self._flush, method)
+        return await future
+
+    def _flush(self, method):
+        batch = self._batches.pop(method, None)
+        timer = self._timers.pop(method, None)
+        if timer:
+            timer.cancel()
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._execute(method, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, method, batch):
+        self.batch_count += 1
+        self.value_count += len(batch)
+        values = [value for value, _ in batch]
+        try:
+            results = await getattr(self.flt, method)(values)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def flush(self):
+        """
+        立即执行所有等待中的批次
+        """
+        for method in list(self._batches):
+            self._flush(method)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def close(self):
+        await self.flush()
+        result = self.flt.close()
+        if asyncio.iscoroutine(result):
+            await result
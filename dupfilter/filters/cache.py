@@ -0,0 +1,146 @@
+# -*- coding:utf-8 -*-
+# author: kusen
+# email: 1194542196@qq.com
+# date: 2024/3/20
+
+
+from cachetools import LRUCache, TTLCache
+
+
+class CacheFilter(object):
+    def __init__(self, flt, maxsize=100000, ttl=None):
+        """
+        进程内一级缓存，包装任意去重方案，只缓存已确认存在或插入成功的值（正缓存），
+        命中时直接返回存在，不再访问Redis/数据库；去重方案操作失败（返回默认值）时不缓存；
+        去重方案置出的值在缓存中仍视为存在，可通过ttl限制缓存时长
+        :param flt: 去重方案
+        :param maxsize: 最大缓存数量，超出后按LRU淘汰
+        :param ttl: 缓存时长（秒），None时不过期
+        """
+        self.flt = flt
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cache = TTLCache(maxsize, ttl) if ttl else LRUCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self.flt, name)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+    def _split(self, values):
+        stats, misses, indexes = [None] * len(values), [], []
+        for index, value in enumerate(values):
+            if self.cache.get(value):
+                stats[index] = True
+            else:
+                misses.append(value)
+                indexes.append(index)
+        self.hits += len(values) - len(misses)
+        self.misses += len(misses)
+        return stats, misses, indexes
+
+    def _error_count(self):
+        return getattr(self.flt, 'error_count', 0)
+
+    def _merge(self, stats, misses, indexes, results, error_count,
+               inserted=False):
+        """
+        合并未命中部分的结果，已确认存在的值写入缓存；inserted为True时全部值均已存在；
+        调用期间去重方案失败过则结果可能为默认值，不写入缓存
+        """
+        cached = self._error_count() == error_count
+        for index, value, stat in zip(indexes, misses, results):
+            stats[index] = stat
+            if cached and (stat or inserted):
+                self.cache[value] = True
+        return stats
+
+    def _cache_inserted(self, values, results, error_count):
+        if self._error_count() != error_count:
+            return
+        for value, stat in zip(values, results):
+            if stat:
+                self.cache[value] = True
+
+    def exists(self, value):
+        return self.exists_many([value])[0]
+
+    def exists_many(self, values):
+        stats, misses, indexes = self._split(values)
+        if misses:
+            error_count = self._error_count()
+            results = self.flt.exists_many(misses)
+            self._merge(stats, misses, indexes, results, error_count)
+        return stats
+
+    def insert(self, value):
+        return self.insert_many([value])[0]
+
+    def insert_many(self, values):
+        error_count = self._error_count()
+        results = self.flt.insert_many(values)
+        self._cache_inserted(values, results, error_count)
+        return results
+
+    def exists_and_insert(self, value):
+        return self.exists_and_insert_many([value])[0]
+
+    def exists_and_insert_many(self, values):
+        stats, misses, indexes = self._split(values)
+        if misses:
+            error_count = self._error_count()
+            results = self.flt.exists_and_insert_many(misses)
+            self._merge(stats, misses, indexes, results, error_count, True)
+        return stats
+
+    def clear(self):
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        return self.flt.close()
+
+    def release(self, *args, **kwargs):
+        return self.flt.release(*args, **kwargs)
+
+
+class AsyncCacheFilter(CacheFilter):
+    async def exists(self, value):
+        stats = await self.exists_many([value])
+        return stats[0]
+
+    async def exists_many(self, values):
+        stats, misses, indexes = self._split(values)
+        if misses:
+            error_count = self._error_count()
+            results = await self.flt.exists_many(misses)
+            self._merge(stats, misses, indexes, results, error_count)
+        return stats
+
+    async def insert(self, value):
+        stats = await self.insert_many([value])
+        return stats[0]
+
+    async def insert_many(self, values):
+        error_count = self._error_count()
+        results = await self.flt.insert_many(values)
+        self._cache_inserted(values, results, error_count)
+        return results
+
+    async def exists_and_insert(self, value):
+        stats = await self.exists_and_insert_many([value])
+        return stats[0]
+
+    async def exists_and_insert_many(self, values):
+        stats, misses, indexes = self._split(values)
+        if misses:
+            error_count = self._error_count()
+            results = await self.flt.exists_and_insert_many(misses)
+            self._merge(stats, misses, indexes, results, error_count, True)
+        return stats
@@ -4,50 +4,364 @@
 # date: 2023/9/7
 
 
+import mmap
 import os
 import random
+import re
+import struct
+import threading
 
 from dupfilter.filters import decorate_warning, decorate_reset
-from dupfilter.filters.memory import MemoryFilter
+from dupfilter.filters.memory import MemoryFilter, MemoryBloomFilter
 from dupfilter.filters.memory import MemoryReset
 
 
 class FileReset(MemoryReset):
 
     def reset(self):
+        if self.flt.segment_size:
+            # 分段模式按写入顺序删除最旧的整段文件，只读取被删除的段，不重写文件
+            self.flt._drop_segments(self.reset_count)
+            return
         super(FileReset, self).reset()
-        self.flt.file.truncate(0)
-        for dup in self.flt.dups:
-            self.flt.file.write(dup + '\n')
+        with self.flt.lock:
+            # 缓冲区中可能包含已被删除的值，直接丢弃后整体重写
+            self.flt.buffer = []
+            self.flt._rewrite()
 
 
 class FileFilter(MemoryFilter):
-    def __init__(self,
-                 path='./',
-                 *args, **kwargs):
+    def __init__(self, path='./', *args, digest_size=None,
+                 flush_size=None, flush_interval=None, fsync=False,
+                 segment_size=None, **kwargs):
+        """
+        设置flush_size或flush_interval后开启延迟写入，插入值先写入缓冲区，
+        缓冲区达到flush_size条或每隔flush_interval秒（后台线程）写入文件，
+        进程异常退出时最多丢失flush_size条或flush_interval秒内插入的值，
+        fsync=False时另需考虑系统页缓存中未落盘的数据；调用flush/close立即写入
+        :param path: 去重文件所在目录
+        :param digest_size: 设置后以定长二进制记录存储于dup.bin文件，见MemoryFilter
+        :param flush_size: 缓冲区最大条数
+        :param flush_interval: 缓冲区最大写入间隔（秒）
+        :param fsync: 每次写入文件后是否调用os.fsync落盘
+        :param segment_size: 设置后按每段segment_size条追加写入dup.00000000等分段文件，
+        FileReset按段删除最旧的值，耗时只与删除数量有关
+        :param args:
+        :param kwargs:
+        """
         self.path = path
-        self.file = open(os.path.join(self.path, 'dup'), 'a+')
-        self.file.seek(0)
-        super(FileFilter, self).__init__(*args, **kwargs)
-        self.dups.update(x.rstrip() for x in self.file)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.segment_size = segment_size
+        self.segments = []
+        self.segment_count = 0
+        self.buffer = []
+        self.lock = threading.RLock()
+        self._closed = threading.Event()
+        self._flush_thread = None
+        super(FileFilter, self).__init__(
+            *args, digest_size=digest_size, **kwargs)
+        if self.segment_size:
+            self._import_single_file()
+            self.segments = self._list_segments() or [0]
+            for segment in self.segments[:-1]:
+                with self._open(self._segment_name(segment)) as file:
+                    self.dups.update(self._read(file))
+            self.file = self._open(self._segment_name(self.segments[-1]))
+            self.segment_count = self._update_count(self._read(self.file))
+            if self.segment_count >= self.segment_size:
+                self._roll_segment()
+        else:
+            self.file = self._open(self._single_name())
+            self.dups.update(self._read(self.file))
+        if self.flush_interval:
+            self._flush_thread = threading.Thread(
+                target=self._flush_loop, daemon=True)
+            self._flush_thread.start()
+
+    def _single_name(self):
+        return 'dup.bin' if self.digest_size else 'dup'
+
+    def _import_single_file(self):
+        """
+        开启分段前已有的单文件作为第一段，与分段文件同时存在时无法确定顺序，不予启动
+        """
+        path = os.path.join(self.path, self._single_name())
+        if not os.path.exists(path):
+            return
+        if self._list_segments():
+            raise ValueError(
+                'Both %s and segment files exist in %s!' % (
+                    self._single_name(), self.path))
+        os.rename(path, os.path.join(self.path, self._segment_name(0)))
+        self.logger.info("去重文件%s已转为分段文件%s" % (
+            self._single_name(), self._segment_name(0)))
+
+    def _open(self, name):
+        file = open(os.path.join(self.path, name),
+                    'a+b' if self.digest_size else 'a+')
+        file.seek(0)
+        return file
+
+    def _update_count(self, values):
+        count = 0
+        for value in values:
+            self.dups.add(value)
+            count += 1
+        return count
+
+    def _segment_name(self, segment):
+        return 'dup.%08d%s' % (segment, '.bin' if self.digest_size else '')
+
+    def _list_segments(self):
+        pattern = re.compile(
+            r'^dup\.(\d{8})%s$' % (r'\.bin' if self.digest_size else ''))
+        segments = []
+        for name in os.listdir(self.path):
+            match = pattern.match(name)
+            if match:
+                segments.append(int(match.group(1)))
+        return sorted(segments)
+
+    def _roll_segment(self):
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.file.close()
+        self.segments.append(self.segments[-1] + 1)
+        self.file = self._open(self._segment_name(self.segments[-1]))
+        self.segment_count = 0
+
+    def _rewrite(self):
+        """
+        将全部值写入临时文件后替换去重文件，替换前异常退出时原文件保持完整
+        """
+        name = os.path.join(self.path, self._single_name())
+        temp_name = name + '.tmp'
+        values = list(self.dups)
+        with open(temp_name, 'wb' if self.digest_size else 'w') as file:
+            for start in range(0, len(values), 65536):
+                chunk = values[start:start + 65536]
+                if self.digest_size:
+                    file.write(b''.join(chunk))
+                else:
+                    file.write(''.join(value + '\n' for value in chunk))
+            file.flush()
+            if self.fsync:
+                os.fsync(file.fileno())
+        self.file.close()
+        os.replace(temp_name, name)
+        self.file = self._open(self._single_name())
+
+    def _drop_segments(self, count):
+        with self.lock:
+            self._flush_buffer()
+            dropped = 0
+            while dropped < count and len(self.segments) > 1:
+                name = self._segment_name(self.segments.pop(0))
+                with self._open(name) as file:
+                    for value in self._read(file):
+                        self.dups.discard(value)
+                        dropped += 1
+                os.remove(os.path.join(self.path, name))
+            return dropped
+
+    @property
+    def write_behind(self):
+        return bool(self.flush_size or self.flush_interval)
+
+    def _read(self, file):
+        if not self.digest_size:
+            return (x.rstrip() for x in file)
+        return self._read_records(file)
+
+    def _read_records(self, file):
+        size = self.digest_size
+        while True:
+            chunk = file.read(size * 65536)
+            if not chunk:
+                break
+            for start in range(0, len(chunk) - size + 1, size):
+                yield chunk[start:start + size]
+
+    def _write(self, value):
+        self._write_many([value])
+
+    def _write_many(self, values):
+        if not self.digest_size:
+            values = [value + '\n' for value in values]
+        with self.lock:
+            self.buffer.extend(values)
+            if not self.write_behind or (
+                    self.flush_size and len(self.buffer) >= self.flush_size):
+                self._flush_buffer()
+
+    def _flush_buffer(self):
+        joiner = b'' if self.digest_size else ''
+        while self.buffer:
+            if not self.segment_size:
+                self.file.write(joiner.join(self.buffer))
+                self.buffer = []
+                break
+            room = self.segment_size - self.segment_count
+            self.file.write(joiner.join(self.buffer[:room]))
+            self.segment_count += len(self.buffer[:room])
+            self.buffer = self.buffer[room:]
+            if self.segment_count >= self.segment_size:
+                self._roll_segment()
+        if self.write_behind or self.fsync:
+            self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.warning("去重文件写入失败：%s" % str(e))
+
+    def flush(self):
+        with self.lock:
+            self._flush_buffer()
+            self.file.flush()
+
+    def close(self):
+        self._closed.set()
+        if self._flush_thread:
+            self._flush_thread.join()
+        try:
+            self.flush()
+            self.file.close()
+        except Exception as e:
+            self.logger.warning("去重文件关闭失败：%s" % str(e))
 
     @decorate_reset
     def _insert(self, value):
         self.dups.add(value)
-        self.file.write(value + '\n')
+        self._write(value)
+
+    @decorate_reset
+    def _insert_many(self, values):
+        self.dups.update(values)
+        self._write_many(values)
 
     @decorate_warning
     def insert(self, value):
-        new_value = self._value_hash_and_compress(value)
+        new_value = self._value_digest(value)
         if new_value not in self.dups:
             self._insert(new_value)
         return True
 
+    @decorate_warning
+    def insert_many(self, values):
+        new_values = [self._value_digest(value) for value in values]
+        _, news = self._exists_and_new(new_values)
+        if news:
+            self._insert_many(news)
+        return [True for _ in values]
+
     @decorate_warning
     def exists_and_insert(self, value):
-        new_value = self._value_hash_and_compress(value)
+        new_value = self._value_digest(value)
         stat = new_value in self.dups
         self._log_exists([value], [new_value], [stat])
         if not stat:
             self._insert(new_value)
         return stat
+
+    @decorate_warning
+    def exists_and_insert_many(self, values):
+        new_values = [self._value_digest(value) for value in values]
+        stats, news = self._exists_and_new(new_values)
+        if news:
+            self._insert_many(news)
+        self._log_exists(values, new_values, stats)
+        return stats
+
+    def _load_many(self, values):
+        new_values = [self._value_digest(value) for value in values]
+        _, news = self._exists_and_new(new_values)
+        if news:
+            self.dups.update(news)
+            self._write_many(news)
+
+    def _load_done(self):
+        self.flush()
+
+
+class FileBloomFilter(MemoryBloomFilter):
+    # 文件头：魔数、位数、哈希函数个数、偏移量计算方式、去重数量
+    HEADER_FORMAT = '<4sQHHQ'
+    HEADER_SIZE = 32
+    MAGIC = b'DUPB'
+
+    def __init__(self, path='./', *args, **kwargs):
+        """
+        基于mmap位图文件的布隆过滤器，启动时直接映射文件无需加载，
+        查询直接读取映射页，由系统页缓存作为工作集
+        :param path: 位图文件dup.bloom所在目录
+        :param args:
+        :param kwargs: 见MemoryBloomFilter
+        """
+        self.path = path
+        self.file = None
+        self.mm = None
+        super(FileBloomFilter, self).__init__(*args, **kwargs)
+
+    def _create_bits(self):
+        file_path = os.path.join(self.path, 'dup.bloom')
+        length = self.HEADER_SIZE + (self.size >> 3)
+        mode = self.bloom_hash.MODES.index(self.bloom_hash.mode)
+        self.file = open(file_path, 'a+b')
+        self.file.seek(0, os.SEEK_END)
+        if self.file.tell() == 0:
+            self.file.truncate(length)
+            self.mm = mmap.mmap(self.file.fileno(), length)
+            self._write_header()
+        else:
+            if self.file.tell() != length:
+                self.file.close()
+                raise ValueError('The bloom file size does not match!')
+            self.mm = mmap.mmap(self.file.fileno(), length)
+            magic, size, hash_num, _mode, count = struct.unpack_from(
+                self.HEADER_FORMAT, self.mm)
+            if (magic, size, hash_num, _mode) != (
+                    self.MAGIC, self.size, self.hash_num, mode):
+                self.mm.close()
+                self.file.close()
+                raise ValueError('The bloom file parameters do not match!')
+            self.count = count
+        return memoryview(self.mm)[self.HEADER_SIZE:]
+
+    def _write_header(self):
+        struct.pack_into(
+            self.HEADER_FORMAT, self.mm, 0, self.MAGIC, self.size,
+            self.hash_num, self.bloom_hash.MODES.index(self.bloom_hash.mode),
+            self.count)
+
+    def clear(self):
+        chunk = 1 << 20
+        zeros = bytes(chunk)
+        for start in range(0, len(self.bits), chunk):
+            end = min(start + chunk, len(self.bits))
+            self.bits[start:end] = zeros[:end - start]
+        self.count = 0
+        self._write_header()
+
+    def flush(self):
+        self._write_header()
+        self.mm.flush()
+
+    def _load_done(self):
+        self.flush()
+
+    def close(self):
+        try:
+            self.flush()
+            self.bits.release()
+            self.mm.close()
+            self.file.close()
+        except Exception as e:
+            self.logger.warning("去重文件关闭失败：%s" % str(e))
@@ -4,10 +4,177 @@
 # date: 2023/9/7
 
 
-import random
+import itertools
+import math
 
+from dupfilter import utils
 from dupfilter.filters import Filter, decorate_warning
 from dupfilter.filters import Reset, decorate_reset
+from dupfilter.utils.bloom import BloomHash
+
+
+class DigestSet(object):
+    """
+    定长二进制摘要的开放寻址哈希表（线性探测），摘要连续存放在bytearray中，
+    每个元素约占用digest_size / 装载因子个字节，远小于集合中的字符串
+    """
+    MAX_LOAD = 0.7
+
+    def __init__(self, digest_size=8, capacity=1024):
+        self.digest_size = digest_size
+        self._empty = bytes(digest_size)
+        self._has_empty = False  # 全零摘要与空槽位冲突，单独记录
+        self._init_table(capacity)
+
+    def _init_table(self, capacity):
+        slots = 8
+        while slots * self.MAX_LOAD < capacity:
+            slots <<= 1
+        self._slots = slots
+        self._mask = slots - 1
+        self._table = bytearray(slots * self.digest_size)
+        self._used = 0
+
+    def _home(self, digest):
+        return int.from_bytes(digest[:8], 'little') & self._mask
+
+    def _find(self, digest):
+        size, table, mask = self.digest_size, self._table, self._mask
+        index = self._home(digest)
+        while True:
+            slot = table[index * size:(index + 1) * size]
+            if slot == digest:
+                return index, True
+            if slot == self._empty:
+                return index, False
+            index = (index + 1) & mask
+
+    def _grow(self):
+        digests = [digest for digest in self._iter_table()]
+        self._init_table(self._slots)
+        for digest in digests:
+            self.add(digest)
+
+    def _iter_table(self):
+        size, table, empty = self.digest_size, self._table, self._empty
+        for start in range(0, len(table), size):
+            slot = table[start:start + size]
+            if slot != empty:
+                yield bytes(slot)
+
+    def __len__(self):
+        return self._used + self._has_empty
+
+    def __iter__(self):
+        if self._has_empty:
+            yield self._empty
+        yield from self._iter_table()
+
+    def __contains__(self, digest):
+        if digest == self._empty:
+            return self._has_empty
+        return self._find(digest)[1]
+
+    def add(self, digest):
+        if digest == self._empty:
+            self._has_empty = True
+            return
+        index, found = self._find(digest)
+        if found:
+            return
+        size = self.digest_size
+        self._table[index * size:(index + 1) * size] = digest
+        self._used += 1
+        if self._used > self._slots * self.MAX_LOAD:
+            self._grow()
+
+    def update(self, digests):
+        for digest in digests:
+            self.add(digest)
+
+    def discard(self, digest):
+        if digest == self._empty:
+            self._has_empty = False
+            return
+        index, found = self._find(digest)
+        if not found:
+            return
+        # 向后移位删除，保证线性探测链不断开
+        size, table, mask = self.digest_size, self._table, self._mask
+        i = j = index
+        while True:
+            j = (j + 1) & mask
+            slot = table[j * size:(j + 1) * size]
+            if slot == self._empty:
+                break
+            k = self._home(slot)
+            if (i < k <= j) if i <= j else (i < k or k <= j):
+                continue
+            table[i * size:(i + 1) * size] = slot
+            i = j
+        table[i * size:(i + 1) * size] = self._empty
+        self._used -= 1
+
+
+class GenerationSet(object):
+    """
+    分代集合，新值写入最新一代，最新一代达到generation_size后新建一代，
+    置出时整代丢弃最旧的值，耗时只与置出数量有关且不产生额外内存；
+    查询需逐代判断，代数超过max_generations后新一代的大小翻倍，代数随数量对数增长
+    """
+
+    def __init__(self, generation_size, factory=set, max_generations=16):
+        self.generation_size = generation_size
+        self.factory = factory
+        self.max_generations = max_generations
+        self.generations = [factory()]
+
+    def __len__(self):
+        return sum(len(generation) for generation in self.generations)
+
+    def __iter__(self):
+        return itertools.chain(*self.generations)
+
+    def __contains__(self, value):
+        for generation in reversed(self.generations):
+            if value in generation:
+                return True
+        return False
+
+    def add(self, value):
+        if value in self:
+            return
+        current = self.generations[-1]
+        current.add(value)
+        if len(current) >= self.generation_size:
+            if len(self.generations) >= self.max_generations:
+                self.generation_size *= 2
+            self.generations.append(self.factory())
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def discard(self, value):
+        for generation in self.generations:
+            generation.discard(value)
+
+    def drop_oldest(self, count):
+        """
+        按写入顺序置出最多count个值，整代不超过剩余数量时整代丢弃，
+        否则从最旧的一代中逐个删除；不会丢弃正在写入的最新一代
+        :return: 置出的数量
+        """
+        dropped = 0
+        while len(self.generations) > 1 and (
+                len(self.generations[0]) <= count - dropped):
+            dropped += len(self.generations.pop(0))
+        if dropped < count:
+            oldest = self.generations[0]
+            for item in list(itertools.islice(oldest, count - dropped)):
+                oldest.discard(item)
+                dropped += 1
+        return dropped
 
 
 class MemoryReset(Reset):
@@ -16,47 +183,218 @@ class MemoryReset(Reset):
         return len(self.flt.dups)
 
     def reset(self):
-        rm_items = set(random.sample(self.flt.dups, self.reset_count))
-        self.flt.dups -= rm_items
+        dups, count = self.flt.dups, self.reset_count
+        if isinstance(dups, GenerationSet):
+            dups.drop_oldest(count)
+            return
+        # 只遍历需删除的数量，避免整体复制集合
+        for item in list(itertools.islice(dups, count)):
+            dups.discard(item)
 
 
 class MemoryFilter(Filter):
-    def __init__(self, *args, **kwargs):
-        self.dups = set()
+    def __init__(self, *args, digest_size=None, generation_size=None,
+                 **kwargs):
+        """
+
+        :param digest_size: 设置后以定长二进制摘要（如16或8字节）存储于DigestSet，
+        去重值为十六进制字符串、二进制或整数摘要时直接转换，否则取其md5摘要
+        :param generation_size: 设置后按每代generation_size个存储于GenerationSet，
+        MemoryReset按代置出最旧的值，否则置出任意的值
+        :param args:
+        :param kwargs:
+        """
+        self.digest_size = digest_size
+        self.generation_size = generation_size
+        factory = (lambda: DigestSet(digest_size)) if digest_size else set
+        if generation_size:
+            self.dups = GenerationSet(generation_size, factory)
+        else:
+            self.dups = factory()
         super(MemoryFilter, self).__init__(*args, **kwargs)
+        if generation_size and self.reset:
+            # 代数不超过max_generations，避免查询逐代判断过慢
+            self.dups.generation_size = max(generation_size, int(math.ceil(
+                self.reset.max_count / self.dups.max_generations)))
+
+    def _value_digest(self, value):
+        value = self._value_hash_and_compress(value)
+        if not self.digest_size:
+            return value
+        try:
+            return utils.digest2bytes(value, self.digest_size)
+        except ValueError:
+            return utils.md5_digest(value)[:self.digest_size]
 
     @decorate_warning
     def exists(self, value):
-        new_value = self._value_hash_and_compress(value)
+        new_value = self._value_digest(value)
         stat = new_value in self.dups
         self._log_exists([value], [new_value], [stat])
         return stat
 
     @decorate_warning
     def exists_many(self, values):
-        return [self.exists(value) for value in values]
+        new_values = [self._value_digest(value) for value in values]
+        dups = self.dups
+        stats = [new_value in dups for new_value in new_values]
+        self._log_exists(values, new_values, stats)
+        return stats
 
     @decorate_warning
     @decorate_reset
     def insert(self, value):
-        new_value = self._value_hash_and_compress(value)
+        new_value = self._value_digest(value)
         self.dups.add(new_value)
         return True
 
     @decorate_warning
+    @decorate_reset
     def insert_many(self, values):
-        return [self.insert(value) for value in values]
+        self.dups.update([self._value_digest(value) for value in values])
+        return [True for _ in values]
 
     @decorate_warning
     @decorate_reset
     def exists_and_insert(self, value):
-        new_value = self._value_hash_and_compress(value)
+        new_value = self._value_digest(value)
         stat = new_value in self.dups
         self._log_exists([value], [new_value], [stat])
         if not stat:
             self.dups.add(new_value)
         return stat
 
+    def _exists_and_new(self, new_values):
+        """
+        一次遍历得到去重结果及需插入的值，批次内重复的值首次出现之后视为已存在
+        """
+        dups, stats, news = self.dups, [], {}
+        for new_value in new_values:
+            stat = new_value in dups or new_value in news
+            stats.append(stat)
+            if not stat:
+                news[new_value] = None
+        return stats, list(news)
+
+    @decorate_warning
+    @decorate_reset
+    def exists_and_insert_many(self, values):
+        new_values = [self._value_digest(value) for value in values]
+        stats, news = self._exists_and_new(new_values)
+        self.dups.update(news)
+        self._log_exists(values, new_values, stats)
+        return stats
+
+    def _load_many(self, values):
+        self.dups.update([self._value_digest(value) for value in values])
+
+
+class MemoryBloomReset(Reset):
+    """
+    布隆过滤器无法删除单个元素，达到阈值后清空整个位图
+    """
+
+    @property
+    def current_count(self):
+        return self.flt.count
+
+    def reset(self):
+        self.flt.clear()
+
+
+class MemoryBloomFilter(Filter):
+    def __init__(self, capacity=100000000, error_rate=0.001,
+                 hash_mode='double', *args, **kwargs):
+        """
+        基于bytearray位图的进程内布隆过滤器，按容量和误判率自动计算位图大小，
+        位数向上取整为2的幂，1亿容量、千分之一误判率约占用256M内存
+        :param capacity: 预计去重数量
+        :param error_rate: 期望误判率
+        :param hash_mode: 偏移量计算方式，见BloomHash
+        :param args:
+        :param kwargs:
+        """
+        if capacity <= 0:
+            raise ValueError('The capacity value must be > 0!')
+        if not 0 < error_rate < 1:
+            raise ValueError('The error_rate value must be in (0, 1)!')
+        self.capacity = capacity
+        self.error_rate = error_rate
+        size = -capacity * math.log(error_rate) / (math.log(2) ** 2)
+        self.size = 1 << max(int(math.ceil(math.log2(size))), 3)
+        self.hash_num = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bit = self.size - 1
+        self.bloom_hash = BloomHash(self.bit, self.hash_num, hash_mode)
+        self.count = 0
+        self.bits = self._create_bits()
+        super(MemoryBloomFilter, self).__init__(*args, **kwargs)
+
+    def _create_bits(self):
+        return bytearray(self.size >> 3)
+
+    def clear(self):
+        self.bits = self._create_bits()
+        self.count = 0
+
+    def _get_offsets(self, values):
+        new_values = [self._value_hash_and_compress(value) for value in values]
+        return self.bloom_hash.hash_many(new_values), new_values
+
+    def _exists(self, offsets):
+        bits = self.bits
+        for offset in offsets:
+            if not bits[offset >> 3] & (1 << (offset & 7)):
+                return False
+        return True
+
+    def _insert(self, offsets):
+        bits = self.bits
+        stat = True
+        for offset in offsets:
+            index, mask = offset >> 3, 1 << (offset & 7)
+            if not bits[index] & mask:
+                bits[index] |= mask
+                stat = False
+        if not stat:
+            self.count += 1
+        return stat
+
+    @decorate_warning
+    def exists(self, value):
+        return self.exists_many([value])[0]
+
+    @decorate_warning
+    def exists_many(self, values):
+        offsets, new_values = self._get_offsets(values)
+        stats = [self._exists(offset) for offset in offsets]
+        self._log_exists(values, new_values, stats)
+        return stats
+
     @decorate_warning
+    def insert(self, value):
+        return self.insert_many([value])[0]
+
+    @decorate_warning
+    @decorate_reset
+    def insert_many(self, values):
+        offsets, _ = self._get_offsets(values)
+        for offset in offsets:
+            self._insert(offset)
+        return [True for _ in values]
+
+    @decorate_warning
+    def exists_and_insert(self, value):
+        return self.exists_and_insert_many([value])[0]
+
+    @decorate_warning
+    @decorate_reset
     def exists_and_insert_many(self, values):
-        return [self.exists_and_insert(value) for value in values]
+        offsets, new_values = self._get_offsets(values)
+        stats = [self._insert(offset) for offset in offsets]
+        self._log_exists(values, new_values, stats)
+        return stats
+
+    def _load_many(self, values):
+        offsets, _ = self._get_offsets(values)
+        for offset in offsets:
+            self._insert(offset)
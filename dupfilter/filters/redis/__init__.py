@@ -2,10 +2,165 @@
 # author: kusen
 # email: 1194542196@qq.com
 # date: 2023/9/7
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 from dupfilter.filters import Filter
+from dupfilter.filters import Reset, AsyncReset
+
+
+class RedisReset(Reset):
+    """
+    按分块统计数量，按各分块数量比例分批删除，单次脚本调用最多删除chunk_size个值，
+    避免单次调用长时间阻塞Redis
+    """
+    count_command = None
+
+    def __init__(self, max_count, *args, chunk_size=1000, **kwargs):
+        self.chunk_size = chunk_size
+        super(RedisReset, self).__init__(max_count, *args, **kwargs)
+
+    def _count_pipeline(self):
+        keys = self.flt._get_block_keys()
+        pipe = self.flt.server.pipeline(transaction=False)
+        for key in keys:
+            getattr(pipe, self.count_command)(key)
+        return keys, pipe
+
+    def _get_chunks(self, counts, remove_count):
+        total = sum(counts.values())
+        chunks = []
+        if total <= 0 or remove_count <= 0:
+            return chunks
+        for key, count in counts.items():
+            count = min(count, -(-remove_count * count // total))
+            while count > 0:
+                chunks.append((key, min(count, self.chunk_size)))
+                count -= self.chunk_size
+        return chunks
+
+    def _remove_count(self, total):
+        return total - int(self.max_count * self.reset_to_rate)
+
+    @property
+    def current_count(self):
+        keys, pipe = self._count_pipeline()
+        return sum(pipe.execute())
+
+    def reset(self):
+        keys, pipe = self._count_pipeline()
+        counts = dict(zip(keys, pipe.execute()))
+        for key, count in self._get_chunks(
+                counts, self._remove_count(sum(counts.values()))):
+            self.flt._reset_script(keys=[key], args=[count])
+
+
+class AsyncRedisReset(AsyncReset, RedisReset):
+    async def _current_count(self):
+        keys, pipe = self._count_pipeline()
+        return sum(await pipe.execute())
+
+    @property
+    def current_count(self):
+        return self._current_count()
+
+    async def reset(self):
+        keys, pipe = self._count_pipeline()
+        counts = dict(zip(keys, await pipe.execute()))
+        for key, count in self._get_chunks(
+                counts, self._remove_count(sum(counts.values()))):
+            await self.flt._reset_script(keys=[key], args=[count])
 
 
 class RedisFilter(Filter):
+    default_chunk_size = 1000
+
     def __init__(self, server, *args, **kwargs):
+        """
+
+        :param server: The redis obj, redis.Redis()/redis.RedisCluster()
+        :param args:
+        :param kwargs: cluster: Redis集群模式，分块键以{key+分块}命名（hash tag），
+        批量操作按槽位分组，各组分别调用脚本后按原顺序合并结果
+        cluster_workers: 集群模式同步方案并发执行的最大线程数，异步方案并发执行全部分组
+        """
         self.server = server
+        self.cluster = kwargs.pop('cluster', False)
+        self.cluster_workers = kwargs.pop('cluster_workers', 8)
+        self._executor = None
         super(RedisFilter, self).__init__(*args, **kwargs)
+
+    def _block_key(self, block):
+        if self.cluster:
+            return '{%s%s}' % (self.key, block)
+        return self.key + block
+
+    def _group_keys(self, keys):
+        """
+        按槽位分组，返回各组在原列表中的下标；同一脚本调用的键必须位于同一槽位
+        """
+        from redis.crc import key_slot
+
+        groups = {}
+        for index, key in enumerate(keys):
+            if isinstance(key, str):
+                key = key.encode('utf-8')
+            slot = key_slot(key)
+            groups.setdefault(slot, []).append(index)
+        return list(groups.values())
+
+    def _split_script_args(self, keys, args, shared_args):
+        groups = self._group_keys(keys)
+        calls = []
+        for indexes in groups:
+            calls.append((
+                [keys[index] for index in indexes],
+                list(shared_args) + [args[index] for index in indexes]
+                if args else list(shared_args)))
+        return groups, calls
+
+    @staticmethod
+    def _merge_script_results(size, groups, results):
+        """
+        返回列表的脚本按下标合并，插入脚本等返回单个值的取全部分组结果的与
+        """
+        if not all(isinstance(result, list) for result in results):
+            return all(results)
+        merged = [None] * size
+        for indexes, result in zip(groups, results):
+            for index, stat in zip(indexes, result):
+                merged[index] = stat
+        return merged
+
+    def _call_script(self, script, keys, args=None, shared_args=()):
+        """
+        执行keys与args一一对应的批量脚本，shared_args为所有键共用的前置参数；
+        集群模式下按槽位分组并发执行
+        """
+        if not self.cluster:
+            return script(keys=keys, args=list(shared_args) + list(args or []))
+        groups, calls = self._split_script_args(keys, args, shared_args)
+        if len(calls) == 1:
+            return script(keys=calls[0][0], args=calls[0][1])
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.cluster_workers)
+        results = list(self._executor.map(
+            lambda call: script(keys=call[0], args=call[1]), calls))
+        return self._merge_script_results(len(keys), groups, results)
+
+    async def _async_call_script(self, script, keys, args=None,
+                                 shared_args=()):
+        if not self.cluster:
+            return await script(
+                keys=keys, args=list(shared_args) + list(args or []))
+        groups, calls = self._split_script_args(keys, args, shared_args)
+        results = await asyncio.gather(*[
+            script(keys=_keys, args=_args) for _keys, _args in calls])
+        return self._merge_script_results(len(keys), groups, list(results))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        return super(RedisFilter, self).close()
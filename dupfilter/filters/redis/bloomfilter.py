@@ -4,10 +4,20 @@
 # date: 2023/9/6
 
 
+import math
+import time
+
 from dupfilter import utils
-from dupfilter.filters import decorate_warning
+from dupfilter.utils.bloom import SimpleHash, BloomHash
+from dupfilter.filters import decorate_warning, decorate_chunk
+from dupfilter.filters import Reset, AsyncReset, decorate_reset
 from dupfilter.filters.redis import RedisFilter
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 EXISTS_SCRIPT = """
 local keys = KEYS
 local offsets = ARGV
@@ -54,31 +64,227 @@ end
 return result
 """
 
+ROTATE_EXISTS_SCRIPT = """
+local generation = tonumber(redis.call('GET', KEYS[1]) or 0)
+local rotate_num = tonumber(ARGV[1])
+local result = {}
+for index = 3, #KEYS do
+    local exist = 0
+    for g = generation, math.max(generation - rotate_num + 1, 0), -1 do
+        local key = KEYS[index] .. ':' .. g
+        exist = 1
+        for offset in string.gmatch(ARGV[index - 1], "[^,]+") do
+            if redis.call('GETBIT', key, offset) == 0 then
+                exist = 0
+                break
+            end
+        end
+        if exist == 1 then
+            break
+        end
+    end
+    table.insert(result, exist)
+end
+return result
+"""
+
+ROTATE_EXISTS_AND_INSERT_SCRIPT = """
+local generation = tonumber(redis.call('GET', KEYS[1]) or 0)
+local rotate_num = tonumber(ARGV[1])
+local count = 0
+local result = {}
+for index = 3, #KEYS do
+    local exist = 0
+    local current = 1
+    for g = generation, math.max(generation - rotate_num + 1, 0), -1 do
+        local key = KEYS[index] .. ':' .. g
+        exist = 1
+        for offset in string.gmatch(ARGV[index - 1], "[^,]+") do
+            if redis.call('GETBIT', key, offset) == 0 then
+                exist = 0
+                break
+            end
+        end
+        if exist == 1 then
+            if g ~= generation then
+                current = 0
+            end
+            break
+        end
+        current = 0
+    end
+    if current == 0 then
+        local key = KEYS[index] .. ':' .. generation
+        for offset in string.gmatch(ARGV[index - 1], "[^,]+") do
+            redis.call('SETBIT', key, offset, 1)
+        end
+        count = count + 1
+    end
+    table.insert(result, exist)
+end
+if count > 0 then
+    redis.call('INCRBY', KEYS[2], count)
+end
+return result
+"""
+
 RESET_SCRIPT = """
-local key = KEYS[1]
-local offsets = ARGV
-for _, offset in pairs(offsets) do
-    redis.call('SETBIT', key, offset, 0)
+local generation = tonumber(redis.call('GET', KEYS[1]) or 0)
+if generation ~= tonumber(ARGV[2]) then
+    return generation
 end
-return true
+generation = generation + 1
+redis.call('SET', KEYS[1], generation)
+redis.call('SET', KEYS[2], 0)
+redis.call('SET', KEYS[3], redis.call('TIME')[1])
+local expired = generation - tonumber(ARGV[1])
+if expired >= 0 then
+    for index = 4, #KEYS do
+        redis.call('UNLINK', KEYS[index] .. ':' .. expired)
+    end
+end
+return generation
+"""
+
+SCALABLE_EXISTS_SCRIPT = """
+local layers = tonumber(redis.call('GET', KEYS[1]) or 1)
+if layers ~= tonumber(ARGV[1]) then
+    return {-1, layers}
+end
+local result = {}
+for i = 0, (#KEYS - 2) / layers - 1 do
+    local exist = 0
+    for j = layers, 1, -1 do
+        local index = 2 + i * layers + j
+        exist = 1
+        for offset in string.gmatch(ARGV[index], "[^,]+") do
+            if redis.call('GETBIT', KEYS[index], offset) == 0 then
+                exist = 0
+                break
+            end
+        end
+        if exist == 1 then
+            break
+        end
+    end
+    table.insert(result, exist)
+end
+return result
 """
 
+SCALABLE_EXISTS_AND_INSERT_SCRIPT = """
+local layers = tonumber(redis.call('GET', KEYS[1]) or 1)
+if layers ~= tonumber(ARGV[1]) then
+    return {-1, layers}
+end
+local capacity = tonumber(ARGV[2])
+local count = tonumber(redis.call('GET', KEYS[2]) or 0)
+local result = {}
+for i = 0, (#KEYS - 2) / layers - 1 do
+    local exist = 0
+    for j = layers, 1, -1 do
+        local index = 2 + i * layers + j
+        exist = 1
+        for offset in string.gmatch(ARGV[index], "[^,]+") do
+            if redis.call('GETBIT', KEYS[index], offset) == 0 then
+                exist = 0
+                break
+            end
+        end
+        if exist == 1 then
+            break
+        end
+    end
+    if exist == 0 then
+        local index = 2 + i * layers + layers
+        for offset in string.gmatch(ARGV[index], "[^,]+") do
+            redis.call('SETBIT', KEYS[index], offset, 1)
+        end
+        count = count + 1
+    end
+    table.insert(result, exist)
+    -- 当前层已满时停止，剩余的值由客户端在新的一层重新提交
+    if count >= capacity then
+        break
+    end
+end
+if count >= capacity then
+    redis.call('SET', KEYS[1], layers + 1)
+    redis.call('SET', KEYS[2], 0)
+else
+    redis.call('SET', KEYS[2], count)
+end
+return result
+"""
+
+
+class RedisBloomReset(Reset):
+    def __init__(self, max_count, *args, rotate_interval=None, **kwargs):
+        """
+        轮转布隆过滤器重置，需配合RedisBloomFilter的rotate_num使用；
+        当前时间片插入数量达到max_count * max_rate或距上次轮转超过rotate_interval秒时，
+        新建时间片并删除最旧的时间片，值最少保留rotate_num - 1个时间片
+        :param max_count: 单个时间片的容量
+        :param rotate_interval: 轮转周期（秒）
+        :param args:
+        :param kwargs: 见Reset，reset_to_rate不生效
+        """
+        self.rotate_interval = rotate_interval
+        super(RedisBloomReset, self).__init__(max_count, *args, **kwargs)
+
+    @property
+    def used_rate(self):
+        if self.rotate_interval:
+            now = time.time()
+            self.flt.server.set(self.flt.rotated_key, int(now), nx=True)
+            rotated = int(self.flt.server.get(self.flt.rotated_key))
+            if now - rotated >= self.rotate_interval:
+                return 1
+        return self.current_count / self.max_count
+
+    @property
+    def current_count(self):
+        return int(self.flt.server.get(self.flt.count_key) or 0)
+
+    def reset(self):
+        generation = int(self.flt.server.get(self.flt.generation_key) or 0)
+        self.flt._rotate_script(
+            keys=self.flt._get_rotate_keys(),
+            args=[self.flt.rotate_num, generation])
 
-class SimpleHash(object):
-    def __init__(self, bit, seed):
-        self.bit = bit
-        self.seed = seed
 
-    def hash(self, value):
-        ret = 0
-        for i in range(len(value)):
-            ret += self.seed * ret + ord(value[i])
-        return self.bit & ret
+class AsyncRedisBloomReset(AsyncReset, RedisBloomReset):
+    async def _used_rate(self):
+        if self.rotate_interval:
+            now = time.time()
+            await self.flt.server.set(self.flt.rotated_key, int(now), nx=True)
+            rotated = int(await self.flt.server.get(self.flt.rotated_key))
+            if now - rotated >= self.rotate_interval:
+                return 1
+        return await self.current_count / self.max_count
+
+    async def _current_count(self):
+        return int(await self.flt.server.get(self.flt.count_key) or 0)
+
+    @property
+    def current_count(self):
+        return self._current_count()
+
+    async def reset(self):
+        generation = int(
+            await self.flt.server.get(self.flt.generation_key) or 0)
+        await self.flt._rotate_script(
+            keys=self.flt._get_rotate_keys(),
+            args=[self.flt.rotate_num, generation])
 
 
 class RedisBloomFilter(RedisFilter):
+    rotate_num = None
+    # 导入时每次SETRANGE上传的字节数
+    load_chunk_size = 1 << 20
+
     def __init__(self, server, key, bit=32, hash_num=6, block_num=1,
-                 *args, **kwargs):
+                 *args, hash_mode='simple', rotate_num=None, **kwargs):
         """
 
         :param server: The redis obj, redis.Redis()
@@ -86,6 +292,9 @@ class RedisBloomFilter(RedisFilter):
         :param bit:
         :param hash_num:
         :param block_num:
+        :param hash_mode: 偏移量计算方式，simple兼容已有位图，double速度更快
+        :param rotate_num: 设置后每个分块按时间片存储为key+分块+':'+时间片，
+        查询检查最近rotate_num个时间片，插入写入当前时间片，配合RedisBloomReset轮转
         :param reset: 是否进行重置/清除，
         :param reset_proportion: 达到比例后进行重置/清除，
         :param reset_check_period: 重置/清除比例获取计算周期，
@@ -97,21 +306,41 @@ class RedisBloomFilter(RedisFilter):
         self.hash_num = hash_num
         self.seeds = range(1, hash_num + 1)
         self.shs = [SimpleHash(self.bit, seed) for seed in self.seeds]
+        self.bloom_hash = BloomHash(self.bit, hash_num, hash_mode)
         self.block_num = block_num
+        self.rotate_num = rotate_num
+        self.generation_key = key + ':generation'
+        self.count_key = key + ':count'
+        self.rotated_key = key + ':rotated'
+        self._load_bitmaps = {}
         super(RedisBloomFilter, self).__init__(server, *args, **kwargs)
-        self._exists_script = self.server.register_script(EXISTS_SCRIPT)
-        self._insert_script = self.server.register_script(INSERT_SCRIPT)
-        self._exists_insert_script = self.server.register_script(
-            EXISTS_AND_INSERT_SCRIPT)
+        if isinstance(self.reset, RedisBloomReset) and not self.rotate_num:
+            # 未开启轮转时不会累计count_key，也没有可轮转的时间片
+            raise ValueError('The RedisBloomReset requires rotate_num!')
+        if self.rotate_num and self.cluster:
+            # 轮转脚本同时访问计数键与各分块的时间片键，无法位于同一槽位
+            raise ValueError('The rotate_num is not supported in cluster mode!')
+        if self.rotate_num:
+            self._exists_script = self.server.register_script(
+                ROTATE_EXISTS_SCRIPT)
+            self._insert_script = self._exists_insert_script = \
+                self.server.register_script(ROTATE_EXISTS_AND_INSERT_SCRIPT)
+        else:
+            self._exists_script = self.server.register_script(EXISTS_SCRIPT)
+            self._insert_script = self.server.register_script(INSERT_SCRIPT)
+            self._exists_insert_script = self.server.register_script(
+                EXISTS_AND_INSERT_SCRIPT)
+        self._rotate_script = self.server.register_script(RESET_SCRIPT)
 
     @decorate_warning
     def exists(self, value):
         return self.exists_many([value])[0]
 
+    @decorate_chunk
     @decorate_warning
     def exists_many(self, values):
         keys, offsets, new_values = self._get_keys_and_offsets(values)
-        stats = self._exists_script(keys=keys, args=offsets)
+        stats = self._call_script(self._exists_script, keys, offsets)
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, new_values, stats)
         return stats
@@ -120,34 +349,108 @@ class RedisBloomFilter(RedisFilter):
     def insert(self, value):
         return self.insert_many([value])[0]
 
+    @decorate_chunk
     @decorate_warning
+    @decorate_reset
     def insert_many(self, values):
         keys, offsets, new_values = self._get_keys_and_offsets(values)
-        stat = self._insert_script(keys=keys, args=offsets)
+        stat = self._call_script(self._insert_script, keys, offsets)
         return [bool(stat) for _ in range(len(values))]
 
     @decorate_warning
     def exists_and_insert(self, value):
         return self.exists_and_insert_many([value])[0]
 
+    @decorate_chunk
     @decorate_warning
+    @decorate_reset
     def exists_and_insert_many(self, values):
         keys, offsets, new_values = self._get_keys_and_offsets(values)
-        stats = self._exists_insert_script(keys=keys, args=offsets)
+        stats = self._call_script(self._exists_insert_script, keys, offsets)
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, new_values, stats)
         return stats
 
     def _get_keys_and_offsets(self, values):
         values = [self._value_hash(value) for value in values]
-        keys = [self.key + self._get_block(value) for value in values]
-        offsets = [','.join([str(sh.hash(
-            self._value_compress(value))) for sh in self.shs]
-        ) for value in values]
+        keys = [self._block_key(self._get_block(value)) for value in values]
+        offsets = self.bloom_hash.hash_many(
+            [self._value_compress(value) for value in values])
+        offsets = [','.join(map(str, offset)) for offset in offsets]
+        if self.rotate_num:
+            keys = [self.generation_key, self.count_key] + keys
+            offsets = [self.rotate_num] + offsets
         return keys, offsets, values
 
     def _get_block(self, value):
-        return str(int(value[0:2], 16) % self.block_num)
+        return str(utils.digest_first_byte(value) % self.block_num)
+
+    def _load_many(self, values):
+        """
+        在本地位图中置位，全部导入后由_load_done上传；每个分块的本地位图占用
+        (2^bit)/8字节内存，bit=32时为512M；轮转模式直接调用insert_many
+        """
+        if self.rotate_num:
+            return super(RedisBloomFilter, self)._load_many(values)
+        values = [self._value_hash(value) for value in values]
+        blocks = {}
+        offsets = self.bloom_hash.hash_many(
+            [self._value_compress(value) for value in values])
+        for value, offset in zip(values, offsets):
+            key = self._block_key(self._get_block(value))
+            blocks.setdefault(key, []).append(offset)
+        for key, offsets in blocks.items():
+            bits = self._load_bitmaps.get(key)
+            if bits is None:
+                bits = self._load_bitmaps[key] = self._create_load_bitmap()
+            self._set_load_bits(bits, offsets)
+
+    def _create_load_bitmap(self):
+        size = (self.bit + 1) >> 3
+        if numpy is not None:
+            return numpy.zeros(size, dtype=numpy.uint8)
+        return bytearray(size)
+
+    @staticmethod
+    def _set_load_bits(bits, offsets):
+        # Redis位图中偏移量0为首字节的最高位
+        if numpy is not None:
+            offsets = numpy.array(offsets, dtype=numpy.uint64).ravel()
+            masks = numpy.right_shift(
+                128, offsets & numpy.uint64(7)).astype(numpy.uint8)
+            numpy.bitwise_or.at(bits, offsets >> numpy.uint64(3), masks)
+            return
+        for offset in offsets:
+            for _offset in offset:
+                bits[_offset >> 3] |= 128 >> (_offset & 7)
+
+    def _pop_load_bitmaps(self):
+        bitmaps, self._load_bitmaps = self._load_bitmaps, {}
+        return bitmaps.items()
+
+    def _iter_load_chunks(self, bits):
+        view = memoryview(bits)
+        for start in range(0, len(view), self.load_chunk_size):
+            chunk = bytes(view[start:start + self.load_chunk_size])
+            if chunk.strip(b'\x00'):
+                yield start, chunk
+
+    def _load_done(self):
+        """
+        先上传到临时键key:load（跳过全0的部分），再BITOP OR合并到分块键，
+        导入期间其他进程的插入不会丢失
+        """
+        for key, bits in self._pop_load_bitmaps():
+            load_key = key + ':load'
+            self.server.delete(load_key)
+            for start, chunk in self._iter_load_chunks(bits):
+                self.server.setrange(load_key, start, chunk)
+            self.server.bitop('OR', key, key, load_key)
+            self.server.delete(load_key)
+
+    def _get_rotate_keys(self):
+        return [self.generation_key, self.count_key, self.rotated_key] + [
+            self._block_key(str(block)) for block in range(self.block_num)]
 
 
 class AsyncRedisBloomFilter(RedisBloomFilter):
@@ -156,10 +459,12 @@ class AsyncRedisBloomFilter(RedisBloomFilter):
         stats = await self.exists_many([value])
         return stats[0]
 
+    @decorate_chunk
     @decorate_warning
     async def exists_many(self, values):
         keys, offsets, new_values = self._get_keys_and_offsets(values)
-        stats = await self._exists_script(keys=keys, args=offsets)
+        stats = await self._async_call_script(
+            self._exists_script, keys, offsets)
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, new_values, stats)
         return stats
@@ -169,10 +474,13 @@ class AsyncRedisBloomFilter(RedisBloomFilter):
         stats = await self.insert_many([value])
         return stats[0]
 
+    @decorate_chunk
     @decorate_warning
+    @decorate_reset
     async def insert_many(self, values):
         keys, offsets, new_values = self._get_keys_and_offsets(values)
-        stat = await self._insert_script(keys=keys, args=offsets)
+        stat = await self._async_call_script(
+            self._insert_script, keys, offsets)
         return [bool(stat) for _ in range(len(values))]
 
     @decorate_warning
@@ -180,14 +488,234 @@ class AsyncRedisBloomFilter(RedisBloomFilter):
         stats = await self.exists_and_insert_many([value])
         return stats[0]
 
+    @decorate_chunk
     @decorate_warning
+    @decorate_reset
     async def exists_and_insert_many(self, values):
         keys, offsets, new_values = self._get_keys_and_offsets(values)
-        stats = await self._exists_insert_script(keys=keys, args=offsets)
+        stats = await self._async_call_script(
+            self._exists_insert_script, keys, offsets)
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, new_values, stats)
         return stats
 
+    async def _load_done(self):
+        for key, bits in self._pop_load_bitmaps():
+            load_key = key + ':load'
+            await self.server.delete(load_key)
+            for start, chunk in self._iter_load_chunks(bits):
+                await self.server.setrange(load_key, start, chunk)
+            await self.server.bitop('OR', key, key, load_key)
+            await self.server.delete(load_key)
+
+
+class BloomLayer(object):
+    def __init__(self, capacity, error_rate, block_num, hash_mode):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # 每层的值按分块分散，单个分块最大2^32位（512M），超出时增加该层的分块数量，
+        # 分块按摘要首字节分配，最多256个
+        size = -capacity * math.log(error_rate) / (math.log(2) ** 2)
+        self.block_num = max(block_num, int(math.ceil(size / (1 << 32))))
+        if self.block_num > 256:
+            raise ValueError(
+                'The bloom layer needs %s blocks, more than 256!' %
+                self.block_num)
+        self.bit = (1 << max(int(math.ceil(
+            math.log2(size / self.block_num))), 3)) - 1
+        self.hash_num = max(int(math.ceil(-math.log2(error_rate))), 1)
+        self.bloom_hash = BloomHash(self.bit, self.hash_num, hash_mode)
+
+
+class RedisScalableBloomFilter(RedisBloomFilter):
+    def __init__(self, server, key, capacity=100000000, error_rate=0.001,
+                 growth=2, tightening=0.5, block_num=1, hash_mode='simple',
+                 max_retries=5, *args, **kwargs):
+        """
+        可扩容布隆过滤器，当前层插入数量达到容量后新建容量更大、误判率更低的一层
+        （新的Redis键），查询时一次Lua调用检查全部层，总误判率不超过error_rate；
+        层数和当前层插入数量保存在Redis中，多个进程共享
+        :param server: The redis obj, redis.Redis()
+        :param key:
+        :param capacity: 第一层容量，第i层容量为capacity * growth ^ i
+        :param error_rate: 总误判率，第i层误判率为
+        error_rate * (1 - tightening) * tightening ^ i
+        :param growth: 容量增长倍数
+        :param tightening: 误判率收紧比例
+        :param block_num: 每层的最少分块数量，单个分块最大512M，超出时该层自动增加分块
+        :param hash_mode: 偏移量计算方式，见BloomHash
+        :param max_retries: 层数被其它进程更新后的最大重试次数
+        """
+        if not 0 < tightening < 1:
+            raise ValueError('The tightening value must be in (0, 1)!')
+        self.key = key
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.block_num = block_num
+        self.hash_mode = hash_mode
+        self.max_retries = max_retries
+        self.layers_key = key + ':layers'
+        self.count_key = key + ':count'
+        self.layers = 1
+        self._layers = []
+        RedisFilter.__init__(self, server, *args, **kwargs)
+        if isinstance(self.reset, RedisBloomReset):
+            raise ValueError(
+                'The RedisBloomReset is not supported by scalable filter!')
+        if self.cluster:
+            raise ValueError(
+                'The scalable bloom filter is not supported in cluster mode!')
+        self._exists_script = self.server.register_script(
+            SCALABLE_EXISTS_SCRIPT)
+        self._exists_insert_script = self.server.register_script(
+            SCALABLE_EXISTS_AND_INSERT_SCRIPT)
+
+    def _get_layer(self, index):
+        while len(self._layers) <= index:
+            i = len(self._layers)
+            self._layers.append(BloomLayer(
+                self.capacity * self.growth ** i,
+                self.error_rate * (1 - self.tightening) * self.tightening ** i,
+                self.block_num, self.hash_mode))
+        return self._layers[index]
+
+    def _get_keys_and_offsets(self, values):
+        values = [self._value_hash(value) for value in values]
+        compressed_values = [self._value_compress(value) for value in values]
+        layers = self.layers
+        layer_offsets = [self._get_layer(index).bloom_hash.hash_many(
+            compressed_values) for index in range(layers)]
+        keys = [self.layers_key, self.count_key]
+        offsets = [layers, self._get_layer(layers - 1).capacity]
+        for i, value in enumerate(values):
+            first_byte = utils.digest_first_byte(value)
+            for j in range(layers):
+                block = first_byte % self._get_layer(j).block_num
+                keys.append('%s%s:%s' % (self.key, block, j))
+                offsets.append(','.join(map(str, layer_offsets[j][i])))
+        return keys, offsets, values
+
+    def _parse_stats(self, stats):
+        """
+        层数与本地不一致时返回None并更新本地层数
+        """
+        if stats and stats[0] == -1:
+            self.layers = int(stats[1])
+            return None
+        return [bool(stat) for stat in stats]
+
+    def _load_many(self, values):
+        """
+        各层大小不同且需按容量扩层，不使用本地位图，直接调用insert_many
+        """
+        return self.insert_many(values)
+
+    def _load_done(self):
+        pass
+
+    def _merge_partial(self, values, result, stats, new_values):
+        """
+        插入脚本在当前层满后停止，只返回已处理部分的结果，剩余的值在新的一层重新提交；
+        层数被其它进程更新时result为None
+        :return: 剩余的值, 层数变化次数
+        """
+        if result is None:
+            return values, 1
+        stats.extend(result[0])
+        new_values.extend(result[1])
+        if len(result[0]) < len(values):
+            self.layers += 1
+        return values[len(result[0]):], 0
+
+    def _execute(self, script, values):
+        stats, new_values, retries = [], [], 0
+        while values:
+            keys, offsets, _new_values = self._get_keys_and_offsets(values)
+            result = self._parse_stats(script(keys=keys, args=offsets))
+            if result is not None:
+                result = (result, _new_values[:len(result)])
+            values, changed = self._merge_partial(
+                values, result, stats, new_values)
+            retries += changed
+            if retries >= self.max_retries:
+                raise ValueError('The bloom layers changed too frequently!')
+        return stats, new_values
+
+    @decorate_chunk
+    @decorate_warning
+    def exists_many(self, values):
+        stats, new_values = self._execute(self._exists_script, values)
+        self._log_exists(values, new_values, stats)
+        return stats
+
+    @decorate_chunk
+    @decorate_warning
+    def insert_many(self, values):
+        self._execute(self._exists_insert_script, values)
+        return [True for _ in values]
+
+    @decorate_chunk
+    @decorate_warning
+    def exists_and_insert_many(self, values):
+        stats, new_values = self._execute(self._exists_insert_script, values)
+        self._log_exists(values, new_values, stats)
+        return stats
+
+
+class AsyncRedisScalableBloomFilter(RedisScalableBloomFilter):
+    @decorate_warning
+    async def exists(self, value):
+        stats = await self.exists_many([value])
+        return stats[0]
+
+    async def _execute(self, script, values):
+        stats, new_values, retries = [], [], 0
+        while values:
+            keys, offsets, _new_values = self._get_keys_and_offsets(values)
+            result = self._parse_stats(await script(keys=keys, args=offsets))
+            if result is not None:
+                result = (result, _new_values[:len(result)])
+            values, changed = self._merge_partial(
+                values, result, stats, new_values)
+            retries += changed
+            if retries >= self.max_retries:
+                raise ValueError('The bloom layers changed too frequently!')
+        return stats, new_values
+
+    @decorate_chunk
+    @decorate_warning
+    async def exists_many(self, values):
+        stats, new_values = await self._execute(self._exists_script, values)
+        self._log_exists(values, new_values, stats)
+        return stats
+
+    @decorate_warning
+    async def insert(self, value):
+        stats = await self.insert_many([value])
+        return stats[0]
+
+    @decorate_chunk
+    @decorate_warning
+    async def insert_many(self, values):
+        await self._execute(self._exists_insert_script, values)
+        return [True for _ in values]
+
+    @decorate_warning
+    async def exists_and_insert(self, value):
+        stats = await self.exists_and_insert_many([value])
+        return stats[0]
+
+    @decorate_chunk
+    @decorate_warning
+    async def exists_and_insert_many(self, values):
+        stats, new_values = await self._execute(
+            self._exists_insert_script, values)
+        self._log_exists(values, new_values, stats)
+        return stats
+
+
 if __name__ == '__main__':
     bf = BloomFilter({}, '1', value_compress_func=utils.hex2b64)
     bf.insert("123")
@@ -4,8 +4,10 @@
 # date: 2023/9/6
 
 
-from dupfilter.filters import decorate_warning
+from dupfilter import utils
+from dupfilter.filters import decorate_warning, decorate_chunk, decorate_reset
 from dupfilter.filters.redis import RedisFilter
+from dupfilter.filters.redis import RedisReset, AsyncRedisReset
 
 EXISTS_SCRIPT = """
 local keys = KEYS
@@ -42,11 +44,22 @@ return result
 RESET_SCRIPT = """
 local key = KEYS[1]
 local count = ARGV[1]
-redis.call('SPOP', key, count)
-return true
+local members = redis.call('SPOP', key, count)
+return #members
 """
 
 
+class RedisSetReset(RedisReset):
+    """
+    通过SCARD统计数量，SPOP随机删除
+    """
+    count_command = 'scard'
+
+
+class AsyncRedisSetReset(AsyncRedisReset, RedisSetReset):
+    pass
+
+
 class RedisSetFilter(RedisFilter):
     def __init__(self, server, key, block_num=1, *args, **kwargs):
         self.key = key
@@ -56,15 +69,17 @@ class RedisSetFilter(RedisFilter):
         self._insert_script = self.server.register_script(INSERT_SCRIPT)
         self._exists_and_insert_script = self.server.register_script(
             EXISTS_AND_INSERT_SCRIPT)
+        self._reset_script = self.server.register_script(RESET_SCRIPT)
 
     @decorate_warning
     def exists(self, value):
         return self.exists_many([value])[0]
 
+    @decorate_chunk
     @decorate_warning
     def exists_many(self, values):
         keys, new_values = self._get_keys_and_values(values)
-        stats = self._exists_script(keys=keys, args=new_values)
+        stats = self._call_script(self._exists_script, keys, new_values)
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, new_values, stats)
         return stats
@@ -73,10 +88,13 @@ class RedisSetFilter(RedisFilter):
     def exists_and_insert(self, value):
         return self.exists_and_insert_many([value])[0]
 
+    @decorate_chunk
     @decorate_warning
+    @decorate_reset
     def exists_and_insert_many(self, values):
         keys, new_values = self._get_keys_and_values(values)
-        stats = self._exists_and_insert_script(keys=keys, args=new_values)
+        stats = self._call_script(
+            self._exists_and_insert_script, keys, new_values)
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, new_values, stats)
         return stats
@@ -85,22 +103,30 @@ class RedisSetFilter(RedisFilter):
     def insert(self, value):
         return self.insert_many([value])[0]
 
+    @decorate_chunk
     @decorate_warning
+    @decorate_reset
     def insert_many(self, values):
         keys, values = self._get_keys_and_values(values)
-        stat = self._insert_script(keys=keys, args=values)
+        stat = self._call_script(self._insert_script, keys, values)
         return [bool(stat) for _ in range(len(values))]
 
     def _get_keys_and_values(self, values):
         values = [self._value_hash(value) for value in values]
-        keys = [self.key + self._get_block(value) for value in values]
+        keys = [self._block_key(self._get_block(value)) for value in values]
         values = [self._value_compress(value) for value in values]
         return keys, values
 
     def _get_block(self, value):
         if self.block_num == 1:
             return ''
-        return str(int(value, 16) % self.block_num)
+        return str(utils.digest2int(value) % self.block_num)
+
+    def _get_block_keys(self):
+        if self.block_num == 1:
+            return [self._block_key('')]
+        return [self._block_key(str(block))
+                for block in range(self.block_num)]
 
 
 class AsyncRedisSetFilter(RedisSetFilter):
@@ -109,10 +135,13 @@ class AsyncRedisSetFilter(RedisSetFilter):
         stats = await self.insert_many([value])
         return stats[0]
 
+    @decorate_chunk
     @decorate_warning
+    @decorate_reset
     async def insert_many(self, values):
         keys, values = self._get_keys_and_values(values)
-        stat = await self._insert_script(keys=keys, args=values)
+        stat = await self._async_call_script(
+            self._insert_script, keys, values)
         return [bool(stat) for _ in range(len(values))]
 
     @decorate_warning
@@ -120,23 +149,28 @@ class AsyncRedisSetFilter(RedisSetFilter):
         stats = await self.exists_many([value])
         return stats[0]
 
+    @decorate_chunk
     @decorate_warning
     async def exists_many(self, values):
         keys, new_values = self._get_keys_and_values(values)
-        stats = await self._exists_script(keys=keys, args=new_values)
+        stats = await self._async_call_script(
+            self._exists_script, keys, new_values)
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, new_values, stats)
         return stats
 
     @decorate_warning
     async def exists_and_insert(self, value):
-        stats = await self.exists_and_insert([value])
+        stats = await self.exists_and_insert_many([value])
         return stats[0]
 
+    @decorate_chunk
     @decorate_warning
+    @decorate_reset
     async def exists_and_insert_many(self, values):
         keys, new_values = self._get_keys_and_values(values)
-        stats = await self._exists_and_insert_script(keys=keys, args=values)
+        stats = await self._async_call_script(
+            self._exists_and_insert_script, keys, new_values)
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, new_values, stats)
         return stats
\ No newline at end of file
@@ -4,8 +4,10 @@
 # date: 2023/9/10
 
 
-from dupfilter.filters import decorate_warning
+from dupfilter import utils
+from dupfilter.filters import decorate_warning, decorate_chunk, decorate_reset
 from dupfilter.filters.redis import RedisFilter
+from dupfilter.filters.redis import RedisReset, AsyncRedisReset
 
 EXISTS_SCRIPT = """
 local keys = KEYS
@@ -43,13 +45,76 @@ return result
 """
 RESET_SCRIPT = """
 local key = KEYS[1]
+local count = tonumber(ARGV[1])
+if count <= 0 then
+    return 0
+end
+return redis.call('ZREMRANGEBYRANK', key, 0, count - 1)
+"""
+EXPIRE_SCRIPT = """
+local key = KEYS[1]
 local expire = ARGV[1]
+local count = ARGV[2]
 local ts = redis.call("TIME")[1]
-redis.call('ZREMRANGEBYSCORE', key, 0, ts-expire)
-return true
+local members = redis.call('ZRANGEBYSCORE', key, 0, ts - expire,
+                           'LIMIT', 0, count)
+if #members > 0 then
+    redis.call('ZREM', key, unpack(members))
+end
+return #members
 """
 
 
+class RedisSortedSetReset(RedisReset):
+    """
+    通过ZCARD统计数量，按插入时间删除最旧的值；设置expire后每个监控周期
+    先分批删除插入时间超过expire秒的值，删除后数量仍达到max_count * max_rate时
+    再按数量删除最旧的值
+    """
+    count_command = 'zcard'
+
+    def __init__(self, max_count, *args, expire=None, **kwargs):
+        self.expire = expire
+        super(RedisSortedSetReset, self).__init__(max_count, *args, **kwargs)
+
+    @property
+    def used_rate(self):
+        if self.expire:
+            return 1
+        return super(RedisSortedSetReset, self).used_rate
+
+    def reset(self):
+        if self.expire:
+            for key in self.flt._get_block_keys():
+                while self.flt._expire_script(
+                        keys=[key], args=[self.expire, self.chunk_size]
+                ) >= self.chunk_size:
+                    pass
+            if super(RedisSortedSetReset, self).used_rate < self.max_rate:
+                return
+        super(RedisSortedSetReset, self).reset()
+
+
+class AsyncRedisSortedSetReset(AsyncRedisReset, RedisSortedSetReset):
+    async def _used_rate(self):
+        if self.expire:
+            return 1
+        return await super(AsyncRedisSortedSetReset, self)._used_rate()
+
+    async def reset(self):
+        if self.expire:
+            for key in self.flt._get_block_keys():
+                while await self.flt._expire_script(
+                        keys=[key], args=[self.expire, self.chunk_size]
+                ) >= self.chunk_size:
+                    pass
+            used_rate = await super(
+                AsyncRedisSortedSetReset, self)._used_rate()
+            if used_rate < self.max_rate:
+                return
+        await super(AsyncRedisSortedSetReset, self).reset()
+
+
 class RedisSortedSetFilter(RedisFilter):
     def __init__(self, server, key, block_num=1,
                  *args, **kwargs):
@@ -60,15 +125,18 @@ class RedisSortedSetFilter(RedisFilter):
         self._insert_script = self.server.register_script(INSERT_SCRIPT)
         self._exists_and_insert_script = self.server.register_script(
             EXISTS_AND_INSERT_SCRIPT)
+        self._reset_script = self.server.register_script(RESET_SCRIPT)
+        self._expire_script = self.server.register_script(EXPIRE_SCRIPT)
 
     @decorate_warning
     def exists(self, value):
         return self.exists_many([value])[0]
 
+    @decorate_chunk
     @decorate_warning
     def exists_many(self, values):
         keys, new_values = self._get_keys_and_values(values)
-        stats = self._exists_script(keys=keys, args=new_values)
+        stats = self._call_script(self._exists_script, keys, new_values)
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, new_values, stats)
         return stats
@@ -77,10 +145,13 @@ class RedisSortedSetFilter(RedisFilter):
     def exists_and_insert(self, value):
         return self.exists_and_insert_many([value])[0]
 
+    @decorate_chunk
     @decorate_warning
+    @decorate_reset
     def exists_and_insert_many(self, values):
         keys, new_values = self._get_keys_and_values(values)
-        stats = self._exists_and_insert_script(keys=keys, args=new_values)
+        stats = self._call_script(
+            self._exists_and_insert_script, keys, new_values)
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, new_values, stats)
         return stats
@@ -89,20 +160,26 @@ class RedisSortedSetFilter(RedisFilter):
     def insert(self, value):
         return self.insert_many([value])[0]
 
+    @decorate_chunk
     @decorate_warning
+    @decorate_reset
     def insert_many(self, values):
         keys, values = self._get_keys_and_values(values)
-        stat = self._insert_script(keys=keys, args=values)
+        stat = self._call_script(self._insert_script, keys, values)
         return [bool(stat) for _ in range(len(values))]
 
     def _get_keys_and_values(self, values):
         values = [self._value_hash(value) for value in values]
-        keys = [self.key + self._get_block(value) for value in values]
+        keys = [self._block_key(self._get_block(value)) for value in values]
         values = [self._value_compress(value) for value in values]
         return keys, values
 
     def _get_block(self, value):
-        return str(int(value[0:2], 16) % self.block_num)
+        return str(utils.digest_first_byte(value) % self.block_num)
+
+    def _get_block_keys(self):
+        return [self._block_key(str(block))
+                for block in range(self.block_num)]
 
 
 class AsyncRedisSortedSetFilter(RedisSortedSetFilter):
@@ -111,10 +188,13 @@ class AsyncRedisSortedSetFilter(RedisSortedSetFilter):
         stats = await self.insert_many([value])
         return stats[0]
 
+    @decorate_chunk
     @decorate_warning
+    @decorate_reset
     async def insert_many(self, values):
         keys, values = self._get_keys_and_values(values)
-        stat = await self._insert_script(keys=keys, args=values)
+        stat = await self._async_call_script(
+            self._insert_script, keys, values)
         return [bool(stat) for _ in range(len(values))]
 
     @decorate_warning
@@ -122,23 +202,28 @@ class AsyncRedisSortedSetFilter(RedisSortedSetFilter):
         stats = await self.exists_many([value])
         return stats[0]
 
+    @decorate_chunk
     @decorate_warning
     async def exists_many(self, values):
         keys, new_values = self._get_keys_and_values(values)
-        stats = await self._exists_script(keys=keys, args=new_values)
+        stats = await self._async_call_script(
+            self._exists_script, keys, new_values)
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, new_values, stats)
         return stats
 
     @decorate_warning
     async def exists_and_insert(self, value):
-        stats = await self.exists_and_insert([value])
+        stats = await self.exists_and_insert_many([value])
         return stats[0]
 
+    @decorate_chunk
     @decorate_warning
+    @decorate_reset
     async def exists_and_insert_many(self, values):
         keys, new_values = self._get_keys_and_values(values)
-        stats = await self._exists_and_insert_script(keys=keys, args=new_values)
+        stats = await self._async_call_script(
+            self._exists_and_insert_script, keys, new_values)
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, new_values, stats)
         return stats
\ No newline at end of file
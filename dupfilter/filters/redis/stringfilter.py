@@ -2,7 +2,7 @@
 # author: kusen
 # email: 1194542196@qq.com
 # date: 2023/9/6
-from dupfilter.filters import decorate_warning
+from dupfilter.filters import decorate_warning, decorate_chunk
 from dupfilter.filters.redis import RedisFilter
 
 EXISTS_SCRIPT = """
@@ -46,10 +46,12 @@ class RedisStringFilter(RedisFilter):
     def exists(self, value, expire=7200):
         return self.exists_many([value], expire)[0]
 
+    @decorate_chunk
     @decorate_warning
     def exists_many(self, values, expire=7200):
         keys = [self._value_hash_and_compress(value) for value in values]
-        stats = self.exists_script(keys=keys, args=[expire])
+        stats = self._call_script(
+            self.exists_script, keys, shared_args=[expire])
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, keys, stats)
         return stats
@@ -58,10 +60,12 @@ class RedisStringFilter(RedisFilter):
     def insert(self, value, expire=2592000):
         return self.insert_many([value], expire)[0]
 
+    @decorate_chunk
     @decorate_warning
     def insert_many(self, values, expire=2592000):
         keys = [self._value_hash_and_compress(value) for value in values]
-        stats = self.insert_script(keys=keys, args=[expire])
+        stats = self._call_script(
+            self.insert_script, keys, shared_args=[expire])
         return [bool(stat) for stat in stats]
 
     exists_and_lock = exists
@@ -76,10 +80,12 @@ class AsyncRedisStringFilter(RedisStringFilter):
         stats = await self.insert_many([value], expire)
         return stats[0]
 
+    @decorate_chunk
     @decorate_warning
     async def insert_many(self, values, expire=2592000):
         keys = [self._value_hash_and_compress(value) for value in values]
-        stats = await self.insert_script(keys=keys, args=[expire])
+        stats = await self._async_call_script(
+            self.insert_script, keys, shared_args=[expire])
         return [bool(stat) for stat in stats]
 
     @decorate_warning
@@ -87,10 +93,12 @@ class AsyncRedisStringFilter(RedisStringFilter):
         stats = await self.exists_many([value], expire)
         return stats[0]
 
+    @decorate_chunk
     @decorate_warning
     async def exists_many(self, values, expire=7200):
         keys = [self._value_hash_and_compress(value) for value in values]
-        stats = await self.exists_script(keys=keys, args=[expire])
+        stats = await self._async_call_script(
+            self.exists_script, keys, shared_args=[expire])
         stats = [bool(stat) for stat in stats]
         self._log_exists(values, keys, stats)
         return stats
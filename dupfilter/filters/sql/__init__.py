@@ -4,11 +4,20 @@
 # date: 2023/12/8
 
 
+import contextlib
+import queue
+import threading
 import time
-from dupfilter.filters import Filter, decorate_warning
+from dupfilter.filters import Filter, decorate_warning, decorate_chunk
 
 
 class SQLFilter(Filter):
+    default_chunk_size = 1000
+    placeholder = '%s'
+    # IN查询占位符数量分档，不足时以最后一个值补齐，同一分档复用同一条语句
+    in_buckets = (1, 8, 64, 512)
+    # 数据库支持INSERT ... RETURNING时，exists_and_insert_many以单条语句完成判断和插入
+    returning = False
 
     def __init__(self, connection, table,
                  record_time=False, *args, **kwargs):
@@ -24,6 +33,7 @@ class SQLFilter(Filter):
         self.connection = connection
         self.cursor = self.connection.cursor()
         self.record_time = record_time
+        self._in_sqls = {}
         super(SQLFilter, self).__init__(*args, **kwargs)
         self._create_table()
 
@@ -63,26 +73,57 @@ class SQLFilter(Filter):
     def exists(self, value):
         return self.exists_many([value])[0]
 
+    def _placeholders(self, count):
+        return ', '.join([self.placeholder] * count)
+
+    def _in_sql(self, count):
+        sql = self._in_sqls.get(count)
+        if sql is None:
+            sql = self._in_sqls[count] = (
+                f"select id from {self.table} "
+                f"where id in ({self._placeholders(count)})")
+        return sql
+
     def _exists_sql(self, values):
+        """
+        参数化IN查询，超过最大分档时拆分为多条语句
+        :param values:
+        :return: [(sql, params)], 摘要后的值
+        """
         values = [self._value_hash_and_compress(value) for value in values]
-        s_values = str(tuple(values)) if len(
-            values) > 1 else f"('{values[0]}')"
-        sql = f"select id from {self.table} where id in {s_values}"
-        return sql, values
+        statements = []
+        size = self.in_buckets[-1]
+        for start in range(0, len(values), size):
+            params = values[start:start + size]
+            bucket = next(
+                bucket for bucket in self.in_buckets if bucket >= len(params))
+            params += [params[-1]] * (bucket - len(params))
+            statements.append((self._in_sql(bucket), params))
+        return statements, values
 
+    @decorate_chunk
     @decorate_warning
     def exists_many(self, values):
-        sql, new_values = self._exists_sql(values)
-        self.cursor.execute(sql)
-        result = self.cursor.fetchall()
-        try:
-            result = [res[0] for res in result]
-        except KeyError:
-            result = [res['id'] for res in result]
+        statements, new_values = self._exists_sql(values)
+        result = self._select_ids(self.cursor, statements)
         stats = [value in result for value in new_values]
         self._log_exists(values, new_values, stats)
         return stats
 
+    def _select_ids(self, cursor, statements):
+        result = set()
+        for sql, params in statements:
+            cursor.execute(sql, params)
+            result.update(self._row_ids(cursor.fetchall()))
+        return result
+
+    @staticmethod
+    def _row_ids(rows):
+        try:
+            return [row[0] for row in rows]
+        except KeyError:
+            return [row['id'] for row in rows]
+
     @decorate_warning
     def insert(self, value):
         return self.insert_many([value])[0]
@@ -97,24 +138,83 @@ class SQLFilter(Filter):
             sql = f"INSERT IGNORE INTO {self.table} (id) VALUES (%s)"
         return sql, values
 
+    @decorate_chunk
     @decorate_warning
     def insert_many(self, values):
         sql, values = self._insert_sql(values)
         self.cursor.executemany(sql, values)
-        self.connection.commit()
+        self._commit(len(values))
         return [True for _ in values]
 
+    def _commit(self, count):
+        """
+        插入后提交事务
+        :param count: 本次插入数量
+        :return:
+        """
+        self.connection.commit()
+
     @decorate_warning
     def exists_and_insert(self, value):
         return self.exists_and_insert_many([value])[0]
 
+    def _insert_returning_sql(self, values):
+        """
+        多行VALUES插入，忽略已存在的值并返回实际插入的id，默认为MariaDB语法
+        """
+        values = [self._value_hash_and_compress(value) for value in values]
+        if self.record_time:
+            columns = 'id, insert_time'
+            row = '(%s, %s)' % (self.placeholder, self.placeholder)
+            now = int(time.time())
+            params = [param for value in values for param in (value, now)]
+        else:
+            columns = 'id'
+            row = '(%s)' % self.placeholder
+            params = list(values)
+        rows = ', '.join([row] * len(values))
+        return self._insert_returning_format(columns, rows), params, values
+
+    def _insert_returning_format(self, columns, rows):
+        return (f"INSERT IGNORE INTO {self.table} ({columns}) "
+                f"VALUES {rows} RETURNING id")
+
+    def _parse_returning(self, new_values, rows):
+        """
+        未被插入的值即已存在，同一批次中重复出现的值第二次起视为已存在
+        """
+        inserted = set(self._row_ids(rows))
+        stats, seen = [], set()
+        for value in new_values:
+            stats.append(value not in inserted or value in seen)
+            seen.add(value)
+        return stats
+
+    @decorate_chunk
     @decorate_warning
     def exists_and_insert_many(self, values):
-        stats = self.exists_many(values)
-        values = [value for stat, value in zip(stats, values) if not stat]
-        self.insert_many(values)
+        if not values:
+            return []
+        if not self.returning:
+            stats = self.exists_many(values)
+            values = [value for stat, value in zip(stats, values) if not stat]
+            self.insert_many(values)
+            return stats
+        sql, params, new_values = self._insert_returning_sql(values)
+        self.cursor.execute(sql, params)
+        stats = self._parse_returning(new_values, self.cursor.fetchall())
+        self._commit(len(new_values))
+        self._log_exists(values, new_values, stats)
         return stats
 
+    def _load_many(self, values):
+        """
+        整批在一个事务中插入，不再按chunk_size拆分
+        """
+        sql, values = self._insert_sql(values)
+        self.cursor.executemany(sql, values)
+        self._commit(len(values))
+
     def close(self):
         try:
             self.cursor.close()
@@ -124,6 +224,87 @@ class SQLFilter(Filter):
             self.logger.warning("去重数据库连接关闭失败：%s" % str(e))
 
 
+class PooledSQLFilter(SQLFilter):
+    def __init__(self, connection_factory, table,
+                 record_time=False, *args, pool_size=4, **kwargs):
+        """
+        多线程使用的连接池去重，每次调用从池中取出一个连接，调用结束后回滚未提交的事务
+        并放回；可与具体数据库的去重类组合，如PooledSQLiteFilter
+        :param connection_factory: 无参函数，返回新的数据库连接
+        :param table:
+        :param record_time: 是否记录插入时间
+        :param pool_size: 连接数，即最大并发调用数
+        :param args:
+        :param kwargs:
+        """
+        self.connection_factory = connection_factory
+        self.table = table
+        self.record_time = record_time
+        self.pool_size = pool_size
+        self.pool = queue.Queue()
+        self._local = threading.local()
+        self._in_sqls = {}
+        for _ in range(pool_size):
+            self.pool.put(connection_factory())
+        Filter.__init__(self, *args, **kwargs)
+        with self._acquire():
+            self._create_table()
+
+    @property
+    def connection(self):
+        return self._local.connection
+
+    @property
+    def cursor(self):
+        return self._local.cursor
+
+    @contextlib.contextmanager
+    def _acquire(self):
+        # exists_and_insert_many等内部调用复用当前线程已取出的连接
+        if getattr(self._local, 'connection', None) is not None:
+            yield
+            return
+        connection = self.pool.get()
+        self._local.connection = connection
+        self._local.cursor = connection.cursor()
+        try:
+            yield
+        finally:
+            try:
+                self._local.cursor.close()
+                connection.rollback()
+            except Exception as e:
+                self.logger.warning("去重数据库连接重置失败：%s" % str(e))
+            self._local.connection = self._local.cursor = None
+            self.pool.put(connection)
+
+    def exists_many(self, values):
+        with self._acquire():
+            return super(PooledSQLFilter, self).exists_many(values)
+
+    def insert_many(self, values):
+        with self._acquire():
+            return super(PooledSQLFilter, self).insert_many(values)
+
+    def exists_and_insert_many(self, values):
+        with self._acquire():
+            return super(PooledSQLFilter, self).exists_and_insert_many(values)
+
+    def _load_many(self, values):
+        with self._acquire():
+            return super(PooledSQLFilter, self)._load_many(values)
+
+    def close(self):
+        closed = 0
+        while not self.pool.empty():
+            try:
+                self.pool.get_nowait().close()
+                closed += 1
+            except Exception as e:
+                self.logger.warning("去重数据库连接关闭失败：%s" % str(e))
+        self.logger.info("去重数据库连接关闭成功：%s个" % closed)
+
+
 if __name__ == '__main__':
     import pymysql
 
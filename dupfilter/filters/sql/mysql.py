@@ -4,20 +4,32 @@
 # date: 2024/3/12
 
 
-from dupfilter.filters import Filter, decorate_warning
-from dupfilter.filters.sql import SQLFilter
+from dupfilter.filters import Filter, decorate_warning, decorate_chunk
+from dupfilter.filters.sql import SQLFilter, PooledSQLFilter
 
 
 class MySQLFilter(SQLFilter):
     pass
 
 
+class PooledMySQLFilter(PooledSQLFilter, MySQLFilter):
+    pass
+
+
+class MariaDBFilter(MySQLFilter):
+    """
+    MariaDB 10.5及以上支持INSERT ... RETURNING，exists_and_insert_many单条语句完成
+    """
+    returning = True
+
+
 class AsyncMySQLFilter(SQLFilter, Filter):
     def __init__(self, pool, table,
                  record_time=False, *args, **kwargs):
         self.pool = pool
         self.table = table
         self.record_time = record_time
+        self._in_sqls = {}
         Filter.__init__(self, *args, **kwargs)
 
     async def create_table(self):
@@ -37,23 +49,26 @@ class AsyncMySQLFilter(SQLFilter, Filter):
         result = await self.exists_many([value])
         return result[0]
 
+    @decorate_chunk
     @decorate_warning
     async def exists_many(self, values):
-        sql, new_values = self._exists_sql(values)
+        statements, new_values = self._exists_sql(values)
+        result = set()
         async with self.pool.acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute(sql)
-                result = await cur.fetchall()
-                result = [res[0] for res in result]
-                stats = [value in result for value in new_values]
-                self._log_exists(values, new_values, stats)
-                return stats
+                for sql, params in statements:
+                    await cur.execute(sql, params)
+                    result.update(self._row_ids(await cur.fetchall()))
+        stats = [value in result for value in new_values]
+        self._log_exists(values, new_values, stats)
+        return stats
 
     @decorate_warning
     async def insert(self, value):
         result = await self.insert_many([value])
         return result[0]
 
+    @decorate_chunk
     @decorate_warning
     async def insert_many(self, values):
         sql, values = self._insert_sql(values)
@@ -68,13 +83,37 @@ class AsyncMySQLFilter(SQLFilter, Filter):
         result = await self.exists_and_insert_many([value])
         return result[0]
 
+    @decorate_chunk
     @decorate_warning
     async def exists_and_insert_many(self, values):
-        stats = await self.exists_many(values)
-        values = [value for stat, value in zip(stats, values) if not stat]
-        await self.insert_many(values)
+        if not values:
+            return []
+        if not self.returning:
+            stats = await self.exists_many(values)
+            values = [value for stat, value in zip(stats, values) if not stat]
+            await self.insert_many(values)
+            return stats
+        sql, params, new_values = self._insert_returning_sql(values)
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, params)
+                stats = self._parse_returning(
+                    new_values, await cur.fetchall())
+                await conn.commit()
+        self._log_exists(values, new_values, stats)
         return stats
 
+    async def _load_many(self, values):
+        sql, values = self._insert_sql(values)
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.executemany(sql, values)
+                await conn.commit()
+
+
+class AsyncMariaDBFilter(AsyncMySQLFilter):
+    returning = True
+
 
 if __name__ == '__main__':
     import aiomysql
@@ -11,10 +11,13 @@ from dupfilter.filters.sql.mysql import AsyncMySQLFilter
 
 class OracleSQLFilter(SQLFilter):
 
+    def _placeholders(self, count):
+        return ', '.join(':%d' % index for index in range(1, count + 1))
+
     def _exists_table(self):
-        sql = f"SELECT TABLE_NAME FROM USER_TABLES WHERE TABLE_NAME = '{self.table.upper()}'"
+        sql = "SELECT TABLE_NAME FROM USER_TABLES WHERE TABLE_NAME = :1"
         try:
-            self.cursor.execute(sql)
+            self.cursor.execute(sql, [self.table.upper()])
             res = self.cursor.fetchone()
             return bool(res)
         except:
@@ -29,7 +32,7 @@ class OracleSQLFilter(SQLFilter):
             values = [(value, int(time.time())) for value in values]
         else:
             sql = f"""INSERT /*+ IGNORE_ROW_ON_DUPKEY_INDEX(
-            {self.table} INTO {self.table} (id) VALUES (:1)"""
+            {self.table}(id)) */ INTO {self.table} (id) VALUES (:1)"""
         return sql, values
 
 
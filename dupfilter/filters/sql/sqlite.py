@@ -4,19 +4,152 @@
 # date: 2024/3/13
 
 
+import pathlib
+import queue
+import sqlite3
+import threading
 import time
 
-from dupfilter.filters.sql import SQLFilter
+from dupfilter import utils
+from dupfilter.filters.sql import SQLFilter, PooledSQLFilter
 
 
 class SQLiteFilter(SQLFilter):
+    placeholder = '?'
+    # RETURNING需SQLite 3.35.0及以上
+    returning = sqlite3.sqlite_version_info >= (3, 35, 0)
+
     def _insert_sql(self, values):
         values = [self._value_hash_and_compress(value) for value in values]
         if self.record_time:
-            sql = f"""INSERT INTO {self.table}
+            sql = f"""INSERT OR IGNORE INTO {self.table}
                              (id, insert_time) VALUES (?, ?)"""
             values = [(value, int(time.time())) for value in values]
         else:
-            sql = f"INSERT INTO {self.table} (id) VALUES (?)"
+            sql = f"INSERT OR IGNORE INTO {self.table} (id) VALUES (?)"
             values = [(value, ) for value in values]
         return sql, values
+
+    def _insert_returning_format(self, columns, rows):
+        return (f"INSERT INTO {self.table} ({columns}) VALUES {rows} "
+                f"ON CONFLICT DO NOTHING RETURNING id")
+
+
+class PooledSQLiteFilter(PooledSQLFilter, SQLiteFilter):
+    pass
+
+
+class TunedSQLiteFilter(SQLiteFilter):
+    def __init__(self, connection, table, *args, digest_size=16,
+                 mmap_size=268435456, commit_size=None, read_pool_size=0,
+                 **kwargs):
+        """
+        大规模单机去重，WAL日志、synchronous=NORMAL，去重表以定长二进制摘要为主键
+        （WITHOUT ROWID），多线程使用时connection需以check_same_thread=False创建，
+        写入串行执行，查询可使用只读连接池并发执行
+        :param connection: sqlite3.connect(path, check_same_thread=False)
+        :param table:
+        :param digest_size: 摘要字节数，见MemoryFilter
+        :param mmap_size: 内存映射大小（字节），0不使用
+        :param commit_size: 设置后累计插入commit_size条才提交一次事务，
+        进程异常退出时最多丢失commit_size条，调用flush/close立即提交
+        :param read_pool_size: 只读连接数，0时查询使用写连接
+        :param args:
+        :param kwargs: 见SQLFilter
+        """
+        self.digest_size = digest_size
+        self.mmap_size = mmap_size
+        self.commit_size = commit_size
+        self.lock = threading.RLock()
+        self.pending = 0
+        self._set_pragmas(connection)
+        connection.execute('PRAGMA journal_mode=WAL')
+        self.readers = None
+        super(TunedSQLiteFilter, self).__init__(
+            connection, table, *args, **kwargs)
+        if read_pool_size:
+            self.readers = self._create_readers(read_pool_size)
+
+    def _set_pragmas(self, connection):
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA mmap_size=%d' % int(self.mmap_size))
+
+    def _create_readers(self, size):
+        path = self.connection.execute('PRAGMA database_list').fetchone()[2]
+        if not path:
+            raise ValueError('The read pool requires a database file!')
+        readers = queue.Queue()
+        # 路径中的?、#、%等字符需转义
+        uri = pathlib.Path(path).as_uri() + '?mode=ro'
+        for _ in range(size):
+            connection = sqlite3.connect(
+                uri, uri=True, check_same_thread=False)
+            self._set_pragmas(connection)
+            readers.put(connection)
+        return readers
+
+    def _create_table_sql(self):
+        insert_time = 'insert_time INT,' if self.record_time else ''
+        return f"""
+        CREATE TABLE IF NOT EXISTS {self.table} (
+            id BLOB NOT NULL,
+            {insert_time}
+            PRIMARY KEY (id)
+        ) WITHOUT ROWID
+        """
+
+    def _value_hash_and_compress(self, value):
+        value = self._value_hash(value)
+        try:
+            return utils.digest2bytes(value, self.digest_size)
+        except ValueError:
+            return utils.md5_digest(value)[:self.digest_size]
+
+    def _select_ids(self, cursor, statements):
+        # 未提交的插入只对写连接可见
+        if self.readers is None or self.pending:
+            with self.lock:
+                return super(TunedSQLiteFilter, self)._select_ids(
+                    cursor, statements)
+        connection = self.readers.get()
+        try:
+            return super(TunedSQLiteFilter, self)._select_ids(
+                connection.cursor(), statements)
+        finally:
+            self.readers.put(connection)
+
+    def _commit(self, count):
+        self.pending += count
+        if not self.commit_size or self.pending >= self.commit_size:
+            self.connection.commit()
+            self.pending = 0
+
+    def insert_many(self, values):
+        with self.lock:
+            return super(TunedSQLiteFilter, self).insert_many(values)
+
+    def exists_and_insert_many(self, values):
+        with self.lock:
+            return super(TunedSQLiteFilter, self).exists_and_insert_many(
+                values)
+
+    def _load_many(self, values):
+        with self.lock:
+            return super(TunedSQLiteFilter, self)._load_many(values)
+
+    def _load_done(self):
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            self.connection.commit()
+            self.pending = 0
+
+    def close(self):
+        try:
+            self.flush()
+        except Exception as e:
+            self.logger.warning("去重数据库提交失败：%s" % str(e))
+        while self.readers is not None and not self.readers.empty():
+            self.readers.get().close()
+        super(TunedSQLiteFilter, self).close()
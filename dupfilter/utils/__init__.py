@@ -6,30 +6,158 @@
 import hashlib
 import base64
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
 SFB_CHARACTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
 
 
+def _to_bytes(s):
+    return s if isinstance(s, bytes) else s.encode('utf8')
+
+
 def md5(s):
     _md5 = hashlib.md5()
-    _md5.update(s.encode('utf8'))
+    _md5.update(_to_bytes(s))
     return _md5.hexdigest()
 
 
+def md5_digest(s):
+    """
+    md5原始16字节摘要，省去十六进制转换
+    :param s:
+    :return:
+    """
+    return hashlib.md5(_to_bytes(s)).digest()
+
+
+def md5_int(s):
+    return int.from_bytes(hashlib.md5(_to_bytes(s)).digest(), 'big')
+
+
+def blake2b(s, digest_size=16):
+    return hashlib.blake2b(_to_bytes(s), digest_size=digest_size).hexdigest()
+
+
+def blake2b_digest(s, digest_size=16):
+    return hashlib.blake2b(_to_bytes(s), digest_size=digest_size).digest()
+
+
+def blake2b_int(s, digest_size=8):
+    """
+    blake2b整数摘要，默认64位，可直接用于分块和布隆过滤器偏移量计算
+    :param s:
+    :param digest_size:
+    :return:
+    """
+    return int.from_bytes(hashlib.blake2b(
+        _to_bytes(s), digest_size=digest_size).digest(), 'big')
+
+
+def _require_xxhash():
+    if xxhash is None:
+        raise ImportError('The xxhash package is required, pip install xxhash')
+
+
+def xxh64(s):
+    _require_xxhash()
+    return xxhash.xxh64_hexdigest(_to_bytes(s))
+
+
+def xxh64_int(s):
+    _require_xxhash()
+    return xxhash.xxh64_intdigest(_to_bytes(s))
+
+
+def xxh128_digest(s):
+    _require_xxhash()
+    return xxhash.xxh3_128_digest(_to_bytes(s))
+
+
+def xxh128_int(s):
+    _require_xxhash()
+    return xxhash.xxh3_128_intdigest(_to_bytes(s))
+
+
+def hash_many(values, func=md5):
+    """
+    批量计算摘要
+    :param values:
+    :param func: 上述任一摘要函数
+    :return:
+    """
+    return [func(value) for value in values]
+
+
+def digest2int(value):
+    """
+    十六进制字符串、二进制摘要、整数摘要统一转为整数，同一摘要结果一致
+    :param value:
+    :return:
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return int.from_bytes(value, 'big')
+    return int(value, 16)
+
+
+def digest_first_byte(value):
+    """
+    摘要首字节，用于分块；整数摘要长度不定，取最低字节
+    :param value:
+    :return:
+    """
+    if isinstance(value, int):
+        return value & 0xff
+    if isinstance(value, (bytes, bytearray)):
+        return value[0]
+    return int(value[0:2], 16)
+
+
+def digest2bytes(value, size):
+    """
+    十六进制字符串、二进制摘要、整数摘要统一转为size字节，超出部分截断
+    :param value:
+    :param size:
+    :return:
+    """
+    if isinstance(value, int):
+        return (value & ((1 << (8 * size)) - 1)).to_bytes(size, 'big')
+    if isinstance(value, str):
+        value = bytes.fromhex(value)
+    return bytes(value[:size]).rjust(size, b'\0')
+
+
 def decimal2sfb(num):
-    if num == 0:
-        return ""
-    result = decimal2sfb(num // 64)
-    result += SFB_CHARACTERS[num % 64]
-    return result
+    """
+    十进制转六十四进制，SFB_CHARACTERS即标准base64字符表，
+    按3字节对齐后base64编码，去掉前导的0（即A）即为结果
+    :param num:
+    :return:
+    """
+    length = -(-num.bit_length() // 24) * 3
+    return base64.b64encode(num.to_bytes(length, 'big')).decode(
+        'utf-8').lstrip('A')
 
 
 def hex2sfb(s):
     """
-    自定义十六进制转六十四进制，速度比hex2b64慢10倍，但能压缩少1-3个字符
+    自定义十六进制转六十四进制，比hex2b64少1-3个字符，速度与hex2b64相近
     :param s:
     :return:
     """
-    return decimal2sfb(int(s, 16))
+    if len(s) % 2:
+        return decimal2sfb(int(s, 16))
+    b = bytes.fromhex(s)
+    b = b.rjust(-(-len(b) // 3) * 3, b'\0')
+    return base64.b64encode(b).decode('utf-8').lstrip('A')
+
+
+def hex2sfb_many(values):
+    return [hex2sfb(value) for value in values]
 
 
 def hex2b64(s):
@@ -54,3 +182,26 @@ if __name__ == '__main__':
         hex2b64('698d51a19d8a121ce581499d7b701557')
     t3 = time.time()
     print(t2 - t1, t3 - t2)
+
+    t1 = time.time()
+    hex2sfb_many(['698d51a19d8a121ce581499d7b701557'] * 10000)
+    print(time.time() - t1)
+
+    # 摘要函数单个值耗时对比，md5+int为原先分块时的十六进制往返
+    values = ['https://www.example.com/item/%s' % i for i in range(100000)]
+    funcs = [
+        ('md5', md5),
+        ('md5+int', lambda value: int(md5(value), 16)),
+        ('md5_digest', md5_digest),
+        ('md5_int', md5_int),
+        ('blake2b', blake2b),
+        ('blake2b_digest', blake2b_digest),
+        ('blake2b_int', blake2b_int),
+    ]
+    if xxhash is not None:
+        funcs += [('xxh64_int', xxh64_int), ('xxh128_digest', xxh128_digest)]
+    for name, func in funcs:
+        t1 = time.perf_counter()
+        hash_many(values, func)
+        t2 = time.perf_counter()
+        print('%-16s %.3f us/key' % (name, (t2 - t1) / len(values) * 1e6))
@@ -0,0 +1,142 @@
+# -*- coding:utf-8 -*-
+# author: kusen
+# email: 1194542196@qq.com
+# date: 2023/9/6
+
+"""
+布隆过滤器偏移量计算，Redis与进程内布隆过滤器共用
+"""
+
+import hashlib
+import operator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class SimpleHash(object):
+    def __init__(self, bit, seed):
+        self.bit = bit
+        self.seed = seed
+
+    def hash(self, value):
+        ret = 0
+        for i in range(len(value)):
+            ret += self.seed * ret + ord(value[i])
+        return self.bit & ret
+
+
+class BloomHash(object):
+    """
+    批量偏移量计算，一次计算一批值的全部hash_num个偏移量
+    mode=simple：与SimpleHash结果一致，兼容已有位图，安装numpy时向量化计算
+    mode=double：对一次blake2b摘要做双重哈希，速度快但与已有位图不兼容
+    """
+    MODES = ('simple', 'double')
+
+    def __init__(self, bit, hash_num, mode='simple'):
+        if mode not in self.MODES:
+            raise ValueError('The mode must be one of %s!' % str(self.MODES))
+        self.bit = bit
+        self.hash_num = hash_num
+        self.mode = mode
+        # SimpleHash中ret += seed * ret + c等价于ret = ret * (seed + 1) + c，
+        # 展开即为sum(c[j] * (seed + 1) ^ (L - 1 - j))；bit为2^n-1，
+        # 幂次预先取模后与最后取模结果一致
+        self.multipliers = [seed + 1 for seed in range(1, hash_num + 1)]
+        self._powers = {}
+        self._packed_powers = {}
+
+    def _get_powers(self, length):
+        powers = self._powers.get(length)
+        if powers is None:
+            powers = []
+            for multiplier in self.multipliers:
+                power, _powers = 1, []
+                for _ in range(length):
+                    _powers.append(power)
+                    power = (power * multiplier) & self.bit
+                powers.append(_powers[::-1])
+            self._powers[length] = powers
+        return powers
+
+    def _get_packed_powers(self, length):
+        """
+        将hash_num组幂次按位宽width打包成一个大整数，一次乘加得到全部偏移量，
+        width保证字符编码(<2^21)与幂次乘积累加后各段之间不会进位
+        """
+        packed = self._packed_powers.get(length)
+        if packed is None:
+            width = self.bit.bit_length() + 21 + length.bit_length()
+            powers = self._get_powers(length)
+            packed = (width, [sum(powers[k][j] << (k * width)
+                                  for k in range(self.hash_num))
+                              for j in range(length)])
+            self._packed_powers[length] = packed
+        return packed
+
+    def hash(self, value):
+        return self.hash_many([value])[0]
+
+    def hash_many(self, values):
+        if self.mode == 'double':
+            return [self._double_hash(value) for value in values]
+        if numpy is not None and len(values) > 1:
+            return self._simple_hash_many_numpy(values)
+        return [self._simple_hash(value) for value in values]
+
+    def _simple_hash(self, value):
+        if isinstance(value, int):
+            value = '%x' % value
+        bit = self.bit
+        width, packed = self._get_packed_powers(len(value))
+        codes = value if isinstance(value, bytes) else map(ord, value)
+        total = sum(map(operator.mul, codes, packed))
+        return [(total >> (k * width)) & bit for k in range(self.hash_num)]
+
+    @staticmethod
+    def _codes(value):
+        if isinstance(value, int):
+            value = '%x' % value
+        if isinstance(value, bytes):
+            return list(value)
+        return [ord(c) for c in value]
+
+    def _simple_hash_many_numpy(self, values):
+        # uint64运算按2^64回绕，bit不超过32位，结果与逐个计算一致
+        results = [None] * len(values)
+        groups = {}
+        values = [self._codes(value) for value in values]
+        for index, value in enumerate(values):
+            groups.setdefault(len(value), []).append(index)
+        for length, indexes in groups.items():
+            codes = numpy.array([values[index] for index in indexes],
+                dtype=numpy.uint64).reshape(len(indexes), length)
+            powers = numpy.array(self._get_powers(length),
+                                 dtype=numpy.uint64).reshape(
+                self.hash_num, length)
+            ret = (codes @ powers.T) & numpy.uint64(self.bit)
+            for index, offsets in zip(indexes, ret.tolist()):
+                results[index] = offsets
+        return results
+
+    def _double_hash(self, value):
+        # 已是足够长的二进制或整数摘要时直接使用，不再重复计算摘要
+        if isinstance(value, int) and value.bit_length() > 64:
+            h1, h2 = value & 0xFFFFFFFFFFFFFFFF, value >> 64
+        elif isinstance(value, bytes) and len(value) >= 16:
+            h1 = int.from_bytes(value[:8], 'little')
+            h2 = int.from_bytes(value[8:16], 'little')
+        else:
+            if isinstance(value, int):
+                value = value.to_bytes(8, 'little')
+            elif not isinstance(value, bytes):
+                value = value.encode('utf8')
+            digest = hashlib.blake2b(value, digest_size=16).digest()
+            h1 = int.from_bytes(digest[:8], 'little')
+            h2 = int.from_bytes(digest[8:], 'little')
+        h2 |= 1
+        bit = self.bit
+        return [(h1 + i * h2) & bit for i in range(self.hash_num)]